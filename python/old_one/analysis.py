@@ -1,7 +1,65 @@
 import time
+import atexit
+import contextlib
+import csv
+import glob
+import hashlib
+import io
+import json
+import re
+import shutil
+import sys
+import urllib.parse
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import os
-
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pa_csv = None
+    ds = None
+    pq = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Wyniki z pamięci podręcznej są oddawane jako płytkie kopie (_read_only_view) -
+# na pandas < 3 Copy-on-Write trzeba włączyć, żeby zmiany u wywołującego nie psuły cache
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
+
+# Wersja formatu cache - podbijamy, gdy zmienia się wynik łańcucha obliczeń,
+# żeby manifest wymusił ponowną konwersję starych folderów
+CACHE_FORMAT_VERSION = 5
 
 # Słownik wymagań na podstawie Twojej tabeli
 NORMS = {
@@ -13,21 +71,655 @@ NORMS = {
     'M6': {'Lav': 0.3,  'Uo': 0.35, 'Ul': 0.4,  'TI': 20, 'Rei': 0.30},
 }
 
-class AnalysisCalculator:
+# Cache przechowuje surowe wartości Reluxa: MF odniesienia (bez korekty) i czas świecenia
+# odniesienia dla De. Konfiguracja użytkownika jest nakładana przy odczycie.
+REFERENCE_MF = 0.8
+REFERENCE_BURNING_HOURS = 4000.0
+
+# Kolumny fotometryczne skalowane przez MF (apply_custom_mf)
+MF_COLUMNS = ['Lav [cd/m2]', 'Eav [lx]', 'Emin [lx]', 'Emax [lx]', 'Lmin [cd/m2]', 'Lmax [cd/m2]']
+
+# Parametry normy -> kolumny pomiarowe w danych Reluxa
+NORM_PARAMS = {
+    'Lav': 'Lav [cd/m2]',
+    'Uo': 'Uo (L)',
+    'Ul': 'Ul',
+    'TI': 'TI [%]',
+    'Rei': 'Rei'
+}
+
+# Wirtualne kolumny procentowe (np. 'Lav(M3)') -> (parametr, klasa); nie są zapisywane
+# w cache, tylko liczone przy odczycie z pomiarów bazowych
+NORM_COLUMNS = {f"{param}({class_name})": (param, class_name) for class_name in NORMS for param in NORM_PARAMS}
+
+# Kolumny wejściowe jądra scalonego (kolejność = argumenty jądra)
+FUSED_INPUT_COLUMNS = ['Road W[m]', 'Delta [m]', 'Total power [W]', 'Em [lx]'] + list(NORM_PARAMS.values())
+
+
+def _norm_requirements():
+    """Macierz wymagań NORMS [klasa M1..M6, parametr Lav/Uo/Ul/TI/Rei] w float32"""
+    return np.array([[NORMS[c][p] for p in NORM_PARAMS] for c in NORMS], dtype=np.float32)
+
+
+def _fused_kernel_numpy(road_w, delta, power, em, lav, uo, ul, ti, rei, req, burning_hours):
+    """Wersja NumPy jądra scalonego - te same działania w float32 co ścieżka pandas.
+
+    Zwraca (numery klas, A, Dp, De, Power_per_km); numer len(NORMS) = 'Brak'.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _fused_kernel_numpy_body(road_w, delta, power, em, lav, uo, ul, ti, rei, req, burning_hours)
+
+
+def _fused_kernel_numpy_body(road_w, delta, power, em, lav, uo, ul, ti, rei, req, burning_hours):
+    passed = np.ones((req.shape[0], len(lav)), dtype=bool)
+    for p_idx, values in enumerate((lav, uo, ul, ti, rei)):
+        if p_idx == 3:
+            passed &= values <= req[:, p_idx, None]
+        else:
+            passed &= values >= req[:, p_idx, None]
+    codes = np.where(passed.any(axis=0), passed.argmax(axis=0), req.shape[0])
+
+    area = road_w * delta
+    denom = em * area
+    denom[denom == 0] = np.float32(0.01)
+    dp = np.divide(power, denom, out=denom)
+    np.round(dp, 4, out=dp)
+    de = (power * burning_hours) / (area * np.float32(1000))
+    np.round(de, 4, out=de)
+    power_per_km = np.divide(np.float32(1000), delta)
+    np.multiply(power_per_km, power, out=power_per_km)
+    np.round(power_per_km, 2, out=power_per_km)
+    return codes, area, dp, de, power_per_km
+
+
+def _fused_kernel_loop(road_w, delta, power, em, lav, uo, ul, ti, rei, req, burning_hours):
+    """Jądro scalone jako jedna pętla po wierszach (kompilowane numbą).
+
+    Zaokrąglanie jak w numpy.round: rint(x * 10^d) / 10^d w float32.
+    """
+    n = road_w.shape[0]
+    n_classes = req.shape[0]
+    codes = np.empty(n, dtype=np.int64)
+    area = np.empty(n, dtype=np.float32)
+    dp = np.empty(n, dtype=np.float32)
+    de = np.empty(n, dtype=np.float32)
+    power_per_km = np.empty(n, dtype=np.float32)
+    f4 = np.float32(10000.0)
+    f2 = np.float32(100.0)
+    for i in range(n):
+        code = n_classes
+        for c in range(n_classes):
+            if (lav[i] >= req[c, 0] and uo[i] >= req[c, 1] and ul[i] >= req[c, 2]
+                    and ti[i] <= req[c, 3] and rei[i] >= req[c, 4]):
+                code = c
+                break
+        codes[i] = code
+
+        a = road_w[i] * delta[i]
+        area[i] = a
+        denom = em[i] * a
+        if denom == 0:
+            denom = np.float32(0.01)
+        dp[i] = np.rint((power[i] / denom) * f4) / f4
+        de[i] = np.rint(((power[i] * burning_hours) / (a * np.float32(1000))) * f4) / f4
+        power_per_km[i] = np.rint(((np.float32(1000) / delta[i]) * power[i]) * f2) / f2
+    return codes, area, dp, de, power_per_km
+
+
+# Numba jest opcjonalna - bez niej używamy _fused_kernel_numpy. error_model='numpy': dzielenie
+# przez zero daje inf/NaN jak w NumPy i pandas (zerowa szerokość drogi albo odstęp), a nie wyjątek
+_fused_kernel_jit = (numba.njit(cache=True, nogil=True, error_model='numpy')(_fused_kernel_loop)
+                     if numba is not None else None)
+
+
+class _BufferedConsole:
+    """Konsola zastępcza dla procesów roboczych - zbiera logi zamiast je wypisywać"""
+
     def __init__(self):
+        self.records = []
+
+    def log(self, message, level="info"):
+        self.records.append((message, level))
+
+
+class _IngestStats:
+    """Pomiary etapów ingestii - czas, wiersze, bajty wejścia/wyjścia i szczyt RSS dla każdego kawałka.
+
+    rss_peak to największa pamięć procesu (RSS) w czasie trwania etapu -
+    próbkowana w tle co sample_interval sekund oraz na początku i końcu etapu.
+    Etapy w potoku działają równolegle, więc szczyt obejmuje też pamięć
+    etapów, które w tym czasie pracowały w innych wątkach. Rekordy to zwykłe
+    słowniki, więc procesy robocze odsyłają je razem z logami.
+    """
+
+    sample_interval = 0.01
+
+    def __init__(self):
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, file, part, name, bytes_in=0):
+        """Mierzy blok kodu jako etap; wywołujący uzupełnia w rekordzie rows i bytes_out"""
+        record = {"file": file, "part": part, "stage": name, "rows": 0, "bytes_in": int(bytes_in), "bytes_out": 0}
+        peak = [_current_rss_bytes()]
+        done = threading.Event()
+        sampler = None
+        if peak[0] is not None:
+            sampler = threading.Thread(target=self._sample_rss, args=(peak, done), daemon=True)
+            sampler.start()
+        t_start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - t_start
+            done.set()
+            if sampler is not None:
+                sampler.join()
+                peak[0] = max(peak[0], _current_rss_bytes() or 0)
+            record["rss_peak"] = peak[0]
+        self.records.append(record)
+
+    def _sample_rss(self, peak, done):
+        while not done.wait(self.sample_interval):
+            rss = _current_rss_bytes()
+            if rss is not None and rss > peak[0]:
+                peak[0] = rss
+
+    def summary(self):
+        """Sumy dla etapów w kolejności ich pierwszego wystąpienia"""
+        stages = {}
+        for r in self.records:
+            total = stages.setdefault(r["stage"], {"stage": r["stage"], "chunks": 0, "seconds": 0.0, "rows": 0,
+                                                   "bytes_in": 0, "bytes_out": 0, "rss_peak": None})
+            total["chunks"] += 1
+            total["seconds"] += r["seconds"]
+            total["rows"] += r["rows"]
+            total["bytes_in"] += r["bytes_in"]
+            total["bytes_out"] += r["bytes_out"]
+            if r["rss_peak"] is not None:
+                total["rss_peak"] = max(total["rss_peak"] or 0, r["rss_peak"])
+        for total in stages.values():
+            total["rows_per_s"] = total["rows"] / total["seconds"] if total["seconds"] > 0 else None
+        return list(stages.values())
+
+
+def _frame_bytes(df):
+    """Rozmiar ramki w pamięci (płytko - bez liczenia pojedynczych napisów)"""
+    return int(df.memory_usage(index=False).sum())
+
+
+def _worker_engine(cache_dir, settings):
+    """Tworzy silnik w procesie roboczym - z konsolą buforującą i ustawieniami procesu głównego"""
+    engine = AnalysisCalculator(cache_dir=cache_dir)
+    engine.console = _BufferedConsole()
+    engine.stats = _IngestStats()
+    for name, value in settings.items():
+        setattr(engine, name, value)
+    return engine
+
+
+def _convert_csv_file_worker(csv_path, staging_path, checkpoint, cache_dir, settings):
+    """Punkt wejścia procesu roboczego: konwertuje jeden plik i zwraca (logi, liczba rekordów, pomiary)"""
+    engine = _worker_engine(cache_dir, settings)
+    total_rows = engine._convert_csv_file(csv_path, staging_path, checkpoint)
+    return engine.console.records, total_rows, engine.stats.records
+
+
+def _convert_csv_range_worker(csv_path, header, start, end, staging_path, part_idx, cache_dir, settings):
+    """Punkt wejścia procesu roboczego: konwertuje jeden zakres bajtów pliku do części part_i.
+
+    Zwraca (logi, liczba rekordów, czas startu, czas końca, pomiary).
+    """
+    engine = _worker_engine(cache_dir, settings)
+    engine._stats_file = os.path.basename(csv_path)
+    t_start = time.time()
+    chunk = engine._read_csv_range(csv_path, header, start, end, part_idx)
+    chunk = engine._transform_chunk(chunk, part_idx)
+    engine._write_chunk(chunk, staging_path, part_idx)
+    return engine.console.records, len(chunk), t_start, time.time(), engine.stats.records
+
+
+def _write_part(df, part_path, row_group_size=None):
+    """Zapisuje plik Parquet atomowo - przerwany zapis nie zostawia uszkodzonej części"""
+    tmp_path = part_path + ".tmp"
+    if row_group_size:
+        df.to_parquet(tmp_path, index=False, row_group_size=row_group_size)
+    else:
+        df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, part_path)
+
+
+def _iter_byte_ranges(csv_path, start, range_bytes):
+    """Generator zakresów bajtów (start, end) od pozycji start, wyrównanych do końca linii.
+
+    range_bytes może być funkcją - jest wtedy pytana o rozmiar przed każdym
+    zakresem, co pozwala zmieniać rozmiar kawałków w trakcie czytania.
+    Zakładamy, że pola nie zawierają znaków nowej linii - eksporty batch
+    z Reluxa ich nie mają.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as fh:
+        while start < size:
+            target = start + (range_bytes() if callable(range_bytes) else range_bytes)
+            if target >= size:
+                end = size
+            else:
+                # Przesuwamy się do najbliższego końca linii
+                fh.seek(target)
+                fh.readline()
+                end = fh.tell()
+            yield start, end
+            start = end
+
+
+def _sql_ident(name):
+    """Nazwa kolumny w SQL - w cudzysłowie, bo nazwy Reluxa mają spacje i nawiasy"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_literal(value):
+    """Napis jako literał SQL"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _available_memory_bytes():
+    """Dostępna pamięć RAM w bajtach albo None, gdy nie da się jej ustalić"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        with open('/proc/meminfo', 'r') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _peak_rss_bytes():
+    """Szczytowe zużycie pamięci przez proces (RSS) w bajtach albo None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux podaje KB, macOS bajty
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    return None
+
+
+def _current_rss_bytes():
+    """Bieżące zużycie pamięci przez proces (RSS) w bajtach albo None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        # Linux bez psutil: druga liczba w /proc/self/statm to strony w RAM
+        with open("/proc/self/statm", "r") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _read_header_bytes(csv_path):
+    """Zwraca (surowa linia nagłówka, pozycja początku danych)"""
+    with open(csv_path, 'rb') as fh:
+        header = fh.readline()
+        return header, fh.tell()
+
+
+def _split_csv_byte_ranges(csv_path, range_bytes):
+    """Dzieli plik CSV na zakresy bajtów wyrównane do końca linii. Zwraca (nagłówek, [(start, end), ...])."""
+    header, data_start = _read_header_bytes(csv_path)
+    return header, list(_iter_byte_ranges(csv_path, data_start, range_bytes))
+
+
+class _FilterPlan:
+    """Filtry GUI skompilowane raz na zapytanie - wspólne dla wszystkich metod czytających cache.
+
+    expression() daje wyrażenie Arrow (predicate pushdown na statystykach grup
+    wierszy), a apply() to ten sam filtr w pandas, gdy nie ma pyarrow.
+    """
+
+    TEXT_FILTERS = {
+        'Rozmieszczenie': 'Arrangement',
+        'Nazwa oprawy': 'Ldc name',
+        'Klasa oświetleniowa': 'best_class',
+        'Typ drogi': 'Road type',
+    }
+    NUM_FILTERS = {
+        'Liczba pasów': 'Lanes',
+        'Szerekość drogi [m]': 'Road W[m]',
+        'Odstęp między oprawami [m]': 'Delta [m]',
+        'Wysokość montażu [m]': 'Lph [m]',
+        'Nachylenie (°)': 'Tilt [°]'
+    }
+
+    def __init__(self, filters, deferred=()):
+        self.filters = filters or {}
+        # Kolumny, których filtr trzeba odłożyć na po odczycie (np. best_class
+        # przeliczana z MF aktywnej konfiguracji) - nie idą do wyrażenia Arrow
+        self.deferred = set(deferred)
+        self.text = []
+        for nice_name, col_name in self.TEXT_FILTERS.items():
+            val = self.filters.get(nice_name, "Wszystkie")
+            if val and val != "Wszystkie":
+                # Jak w danych: tylko 'Arrangement' jest oczyszczane ze spacji, nazwy opraw
+                # porównujemy dokładnie (oprawa ze spacją na końcu to inna pozycja w menu)
+                val = str(val)
+                self.text.append((col_name, val.strip() if col_name == 'Arrangement' else val))
+
+        # Używamy bezpiecznej konwersji, bo dane z Combobox to Stringi
+        self.numeric = []
+        for nice_name, col_name in self.NUM_FILTERS.items():
+            val = self.filters.get(nice_name)
+            if val and val != "Wszystkie":
+                try:
+                    self.numeric.append((col_name, float(val)))
+                except (ValueError, TypeError):
+                    continue
+        self._expressions = {}
+
+    def expression(self, schema):
+        """Wyrażenie Arrow dla pliku o danym schemacie (None, gdy nie ma filtrów).
+
+        Literały liczbowe rzutujemy na typ kolumny w pliku (float32), żeby
+        porównanie było zgodne z porównaniem w pandas. Wyrażenia są
+        zapamiętywane per zestaw typów kolumn.
+        """
+        signature = tuple(str(schema.field(col).type) if col in schema.names else None
+                          for col, _ in self.text + self.numeric)
+        if signature in self._expressions:
+            return self._expressions[signature]
+
+        clauses = [pc.field(col) == val for col, val in self.text
+                   if col in schema.names and col not in self.deferred]
+        for col, number in self.numeric:
+            if col not in schema.names or col in self.deferred:
+                continue
+            col_type = schema.field(col).type
+            if pa.types.is_floating(col_type):
+                clauses.append(pc.field(col) == pa.scalar(number, type=col_type))
+            else:
+                clauses.append(pc.field(col) == number)
+
+        expression = None
+        for clause in clauses:
+            expression = clause if expression is None else expression & clause
+        self._expressions[signature] = expression
+        return expression
+
+    def clauses(self):
+        """Zbiór warunków (kolumna, wartość) - plan A zawęża plan B, gdy B.clauses() <= A.clauses()"""
+        return set(self.text) | set(self.numeric)
+
+    def mask(self, df, clauses):
+        """Maska wierszy df spełniających podane warunki (bez zmiany typów kolumn, jak w apply)"""
+        keep = np.ones(len(df), dtype=bool)
+        for col, val in clauses:
+            keep &= (df[col] == val).to_numpy(dtype=bool, na_value=False)
+        return keep
+
+    def columns(self, schema):
+        """Kolumny pliku, których dotyczy expression(schema)"""
+        return list(dict.fromkeys(col for col, _ in self.text + self.numeric
+                                  if col in schema.names and col not in self.deferred))
+
+    def apply(self, df, deferred_only=False):
+        """Ten sam filtr na DataFrame (ścieżka bez pyarrow albo tylko filtry odłożone)"""
+        for col, val in self.text:
+            if deferred_only and col not in self.deferred:
+                continue
+            if col == 'Arrangement':
+                df[col] = df[col].astype(str).str.strip()
+            df = df[df[col] == val]
+        for col, number in self.numeric:
+            if deferred_only and col not in self.deferred:
+                continue
+            df = df[df[col] == number]
+        return df
+
+
+def _read_only_view(df):
+    """Widok wyniku z pamięci podręcznej bez kopiowania danych.
+
+    Przy Copy-on-Write (domyślnie od pandas 3, na starszych włączane przy
+    imporcie modułu) płytka kopia współdzieli bufory, a pierwsza modyfikacja
+    po stronie wywołującego kopiuje tylko zmienianą kolumnę - wersja w cache
+    zostaje nietknięta.
+    """
+    return df.copy(deep=False)
+
+
+# Foldery zrzutu _ResultCache usuwane przy zamknięciu programu
+_SPILL_DIRS_AT_EXIT = set()
+
+
+def _remove_spill_dirs():
+    for path in _SPILL_DIRS_AT_EXIT:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+atexit.register(_remove_spill_dirs)
+
+
+class _ResultCache:
+    """Pamięć podręczna wyników zapytań ograniczona bajtami, z usuwaniem najdawniej używanych (LRU).
+
+    Wpis to gotowy DataFrame albo jego zwarty zamiennik: selekcja wierszy
+    (plik, grupy wierszy, mapa bitowa - zob. AnalysisCalculator._row_selection)
+    lub plik Parquet na dysku (spill). Ramka wypychana z pamięci staje się
+    plikiem na dysku (gdy jest spill_dir) albo selekcją (gdy ją znamy), a zbyt
+    duża, żeby zmieścić się w budżecie, od razu trafia do cache jako selekcja.
+    Zamienniki odtwarza właściciel cache i oddaje ramkę przez put().
+    Pliki zrzutu żyją tylko w czasie działania programu: folder jest czyszczony
+    przy tworzeniu cache i usuwany przy wyjściu.
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, max_spill_bytes=0):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        # klucz -> {"kind": "frame"/"selection"/"spill", "value", "nbytes", "selection"}
+        self.entries = OrderedDict()
+        # Bieżące sumy rozmiarów wpisów w pamięci i na dysku
+        self._memory_total = 0
+        self._spill_total = 0
+        self.lock = threading.Lock()
+        if spill_dir:
+            # Pozostałości po poprzednim uruchomieniu (np. po awarii) nie są nigdzie zapisane
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            _SPILL_DIRS_AT_EXIT.add(spill_dir)
+
+    def memory_bytes(self):
+        return self._memory_total
+
+    def spill_bytes(self):
+        return self._spill_total
+
+    def get(self, key):
+        """Wpis dla klucza (oznaczany jako ostatnio użyty) albo None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def frames(self):
+        """Migawka wpisów trzymanych w pamięci jako ramki: lista (klucz, ramka, selekcja)"""
+        with self.lock:
+            return [(k, e["value"], e["selection"]) for k, e in self.entries.items() if e["kind"] == "frame"]
+
+    def put(self, key, frame, selection=None):
+        """Zapamiętuje wynik; selekcja pozwala go później odtworzyć bez trzymania ramki"""
+        nbytes = int(frame.memory_usage(index=False, deep=True).sum())
+        with self.lock:
+            self._discard(key)
+            if nbytes <= self.max_bytes:
+                self._set(key, {"kind": "frame", "value": frame, "nbytes": nbytes, "selection": selection})
+            elif selection is not None:
+                self._set(key, self._selection_entry(selection))
+            else:
+                return
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._discard(key)
+
+    def _selection_entry(self, selection):
+        nbytes = sum(len(bitmap) for _, _, _, bitmap in selection["files"]) + 1024
+        return {"kind": "selection", "value": selection, "nbytes": nbytes, "selection": selection}
+
+    def _account(self, entry, sign):
+        if entry["kind"] == "spill":
+            self._spill_total += sign * entry["nbytes"]
+        else:
+            self._memory_total += sign * entry["nbytes"]
+
+    def _set(self, key, entry):
+        """Wstawia albo podmienia wpis (podmieniony zachowuje pozycję w kolejce LRU)"""
+        old = self.entries.get(key)
+        if old is not None:
+            self._account(old, -1)
+        self.entries[key] = entry
+        self._account(entry, 1)
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self._account(entry, -1)
+        if entry["kind"] == "spill":
+            self._discard_file(entry["value"])
+
+    @staticmethod
+    def _discard_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _spill(self, key, entry):
+        """Zapisuje ramkę na dysk; zwraca wpis "spill" albo None, gdy się nie da"""
+        if not self.spill_dir or entry["nbytes"] > self.max_spill_bytes:
+            return None
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            digest = hashlib.md5(repr(key).encode("utf-8")).hexdigest()
+            path = os.path.join(self.spill_dir, f"{digest}.parquet")
+            _write_part(entry["value"], path)
+            return {"kind": "spill", "value": path, "nbytes": os.path.getsize(path),
+                    "selection": entry["selection"]}
+        except Exception:
+            return None
+
+    def _evict(self):
+        """Zmniejsza najdawniej używane wpisy, aż pamięć i dysk zmieszczą się w budżetach.
+
+        Każdy krok obniża jeden wpis o poziom: ramka -> plik na dysku albo
+        selekcja, plik na dysku -> selekcja, selekcja -> usunięcie. Zamiennik
+        zachowuje pozycję wpisu w kolejce LRU.
+        """
+        while True:
+            if self._spill_total > self.max_spill_bytes:
+                key = next(k for k, e in self.entries.items() if e["kind"] == "spill")
+            elif self._memory_total > self.max_bytes:
+                # Najpierw zwalniamy ramki, selekcje (małe) usuwamy na końcu
+                key = next((k for k, e in self.entries.items() if e["kind"] == "frame"), None)
+                if key is None:
+                    key = next(k for k, e in self.entries.items() if e["kind"] == "selection")
+            else:
+                return
+            entry = self.entries[key]
+            replacement = self._spill(key, entry) if entry["kind"] == "frame" else None
+            if replacement is None and entry["kind"] != "selection" and entry["selection"] is not None:
+                replacement = self._selection_entry(entry["selection"])
+            if replacement is None:
+                self._discard(key)
+                continue
+            if entry["kind"] == "spill":
+                self._discard_file(entry["value"])
+            self._set(key, replacement)
+
+
+class AnalysisCalculator:
+    def __init__(self, cache_dir="../data_cache"):
         self.console = None
+        # Pomiary etapów ostatniej ingestii (_IngestStats) i plik, którego dotyczą
+        self.stats = None
+        self._stats_file = None
         self.csv_files = []
-        self.cache_dir = "../data_cache"
-        self._filters_cache = {}
-        self._filters_cache_order = []
-        self._filters_cache_limit = 5
+        self.cache_dir = cache_dir
+        # Wyniki get_filtered_data (_ResultCache): budżet pamięci w MB (None = 1/4 budżetu
+        # pamięci ingestii) i miejsce na dysku na wyniki wypchnięte z pamięci (0 = bez zrzutu)
+        self.result_cache_mb = None
+        self.result_spill_mb = 0
+        self._results = None
         self._filters_index_cache_file = os.path.join(self.cache_dir, "_filters_cache.json")
-        # Kolumny potrzebne, na których się skupiam
+        # Tryb SQL (DuckDB): połączenie w pamięci, podpis plików/konfiguracji widoku i blokada
+        self.sql_view_name = "results"
+        self.sql_threads = None
+        self._sql_connection = None
+        self._sql_signature = None
+        self._sql_lock = threading.Lock()
+        # Schematy plików części: ścieżka -> ((mtime, rozmiar), schemat Arrow)
+        self._schema_cache = {}
+        # Manifest: odcisk pliku źródłowego i konfiguracja, z której powstał każdy folder cache
+        self._manifest_file = os.path.join(self.cache_dir, "_manifest.json")
+        # Katalog opraw: id, Ldc name, Lamp info i liczba wierszy w każdym pliku źródłowym
+        self._luminaire_catalog_file = os.path.join(self.cache_dir, "_luminaires.json")
+        # Katalog w pamięci: (mtime pliku, {id: oprawa})
+        self._luminaire_cache = (None, {})
+        # Kolumny potrzebne, na których się skupiam - tylko one są czytane z CSV i trafiają do cache
         self.chosen_columns = [
             'Ldc name', 'Lamp info', 'Total flux [lm]', 'Total power [W]', 'Street',
             'Power/km  [W/km]', 'Road W[m]', 'Lum pos y [m]', 'Lph [m]',
-            'Delta [m]', 'Tilt [°]', 'Lav [cd/m2]', 'Uo (L)', 'Ul', 'TI [%]', 'Rei'
+            'Delta [m]', 'Tilt [°]', 'Lav [cd/m2]', 'Uo (L)', 'Ul', 'TI [%]', 'Rei',
+            # Wymagane przez apply_custom_mf i calculate_efficiency_indicators
+            'Lmin [cd/m2]', 'Lmax [cd/m2]', 'Em [lx]', 'Eav [lx]', 'Emin [lx]', 'Emax [lx]'
         ]
+        # Kolumny tekstowe są słownikowane (category), pozostałe czytamy jako float32
+        self.category_columns = ['Ldc name', 'Lamp info', 'Street']
+        # Silnik CSV: "arrow" (typowany, strumieniowy) lub "pandas" (zapasowy)
+        self.csv_engine = "arrow"
+        self.chunk_rows = 500000
+        # Obliczenia norm i wskaźników: "fused" (jedno jądro, numba jeśli jest) lub "pandas"
+        self.transform_engine = "fused"
+        # Potok ingestii: ile kawałków może czekać w każdej kolejce między wątkami
+        # czytającym, przeliczającym i zapisującym (0 = przetwarzanie szeregowe)
+        self.pipeline_depth = 2
+        # Budżet pamięci ingestii w MB na proces (None = połowa dostępnej RAM). Rozmiar
+        # kawałka jest dobierany z rzeczywistego zużycia pamięci przez pierwszy kawałek
+        self.memory_budget_mb = None
+        self.min_chunk_rows = 20000
+        self.max_chunk_rows = 5000000
+        # Układ cache: "flat" (part_i.parquet) albo "hive" (katalogi kolumna=wartość)
+        self.cache_layout = "flat"
+        self.partition_columns = ['Arrangement', 'best_class', 'Road W[m]']
+        # Kolejność sortowania przy zapisie: wiersze o tych samych wartościach filtrów
+        # lądują w tych samych grupach wierszy, więc statystyki min/max pozwalają je pomijać
+        self.cluster_columns = ['Arrangement', 'best_class', 'Road W[m]', 'Ldc name',
+                                'Delta [m]', 'Lph [m]', 'Tilt [°]']
+        self.row_group_size = 50000
+        # Kostka agregatów (_cube.parquet w każdym folderze cache) dla wykresów 1-3
+        self.cube_keys = ['Arrangement', 'Road W[m]', 'best_class', 'Ldc name',
+                          'Delta [m]', 'Lph [m]', 'Tilt [°]']
+        self.cube_values = ['De', 'Dp', 'Total flux [lm]']
+        # Aktywna konfiguracja (MF różne od 0.8 i czas świecenia) - nakładana przy odczycie
+        self.active_mf = {}
+        self.active_burning_hours = REFERENCE_BURNING_HOURS
+        # Liczba wątków skanujących pliki części przy zapytaniach z GUI
+        self.query_workers = min(4, os.cpu_count() or 1)
+        # Mapowanie filtrów GUI na kolumny partycji
+        self.partition_filters = {
+            'Rozmieszczenie': 'Arrangement',
+            'Klasa oświetleniowa': 'best_class',
+            'Szerekość drogi [m]': 'Road W[m]',
+        }
         # Tworzenie folderu na pliki binarne, jeśli nie istnieje
         if not os.path.exists(self.cache_dir):
             os.makedirs(self.cache_dir)
@@ -64,8 +756,7 @@ class AnalysisCalculator:
     def set_csv_files(self, csv_files):
         """Metoda wywoływana przez GUI zaraz po wyborze folderu"""
         self.csv_files = csv_files
-        self._filters_cache.clear()
-        self._filters_cache_order = []
+        self._clear_results()
         # Zamiast print, używamy log:
         if csv_files:
             self.log(f"Załadowano listę plików: {len(csv_files)} szt.", "success")
@@ -73,30 +764,38 @@ class AnalysisCalculator:
             self.log("Wybrany folder nie zawiera plików CSV!", "warning")
 
     def decode_arrangement(self, df):
-        """Rozpoznaje typ rozmieszczenia i raportuje statystyki do konsoli"""
+        """Rozpoznaje typ rozmieszczenia i raportuje statystyki do konsoli.
+
+        'Street' ma tylko kilka różnych wartości (np. "2lanes_SGL"), więc każdą
+        dekodujemy raz (_decode_street), a wynik rozkładamy na wiersze przez
+        kody kategorii. Poza 'Arrangement' (category) powstają kolumny 'Lanes'
+        (liczba pasów) i 'Road type' (nazwa bez kodu układu, np. "2lanes").
+        """
         if 'Street' not in df.columns:
             self.log("Brak kolumny 'Street' – nie można rozpoznać układu!", "warning")
             df['Arrangement'] = "Nieokreślone"
             return df
 
-        # Słownik mapujący
-        mapping = {
-            'SGL': 'Jednostronny',
-            'OPP': 'Naprzeciwlegly',
-            'STG': 'Naprzemianlegly'
-        }
+        street = df['Street']
+        if not isinstance(street.dtype, pd.CategoricalDtype):
+            street = street.astype('category')
+        # Ostatnia pozycja obsługuje kod -1 (brak wartości w 'Street')
+        decoded = [self._decode_street(str(v)) for v in street.cat.categories] + [("Inne", np.nan, "Nieokreślone")]
+        codes = street.cat.codes.to_numpy()
 
-        df['Arrangement'] = "Inne"
+        arrangements = sorted({d[0] for d in decoded})
+        arrangement_codes = np.array([arrangements.index(d[0]) for d in decoded], dtype=np.int8)
+        df['Arrangement'] = pd.Categorical.from_codes(arrangement_codes[codes], categories=arrangements)
 
-        # Logujemy rozpoczęcie analizy geometrii
-        # (używamy małego wcięcia ∟, żeby log był czytelny pod nazwą pliku)
-        for code, name in mapping.items():
-            mask = df['Street'].str.contains(code, na=False)
-            df.loc[mask, 'Arrangement'] = name
+        df['Lanes'] = np.array([d[1] for d in decoded], dtype=np.float32)[codes]
+
+        road_types = sorted({d[2] for d in decoded})
+        road_type_codes = np.array([road_types.index(d[2]) for d in decoded], dtype=np.int16)
+        df['Road type'] = pd.Categorical.from_codes(road_type_codes[codes], categories=road_types)
 
         # --- FAJNA OPCJA: Statystyka układów w tym pliku ---
         found_types = df['Arrangement'].value_counts()
-        summary = ", ".join([f"{k}: {v}" for k, v in found_types.items() if k != "Inne"])
+        summary = ", ".join([f"{k}: {v}" for k, v in found_types.items() if k != "Inne" and v])
 
         if summary:
             self.log(f"  ∟ Geometria: {summary}", "info")
@@ -105,55 +804,132 @@ class AnalysisCalculator:
 
         return df
 
-    def apply_custom_mf(self, df, mf_map):
-        """Przelicza parametry świetlne na podstawie MF wybranego przez użytkownika"""
-        if not mf_map:
-            return df
+    def _decode_street(self, street):
+        """Dekoduje jedną nazwę ulicy Reluxa, np. "2lanes_SGL" -> ("Jednostronny", 2.0, "2lanes")"""
+        # Słownik mapujący
+        mapping = {
+            'SGL': 'Jednostronny',
+            'OPP': 'Naprzeciwlegly',
+            'STG': 'Naprzemianlegly'
+        }
 
-        # Tworzymy klucz identyfikujący oprawę
-        df['lum_key'] = df['Ldc name'].astype(str) + " " + df['Lamp info'].astype(str)
+        # Jak dawniej str.contains po kolei - przy kilku kodach wygrywa ostatni
+        arrangement = "Inne"
+        for code, name in mapping.items():
+            if code in street:
+                arrangement = name
 
-        # Logujemy tylko zmienione MF dla opraw, które występują w chunce
-        present_lums = set(df['lum_key'].unique())
-        for lum, mf in mf_map.items():
-            try:
-                new_mf = float(mf)
-            except Exception:
-                continue
-            if new_mf != 0.8 and lum in present_lums:
-                multiplier = new_mf / 0.8
-                self.log(f"  ∟ Korekta fotometrii: {lum[:40]}... -> MF: {new_mf} (x{multiplier:.2f})", "info")
+        lanes_match = re.search(r'(\d+)\s*lanes?', street, re.IGNORECASE)
+        lanes = float(lanes_match.group(1)) if lanes_match else np.nan
 
-        mf_map_float = {}
-        for lum, mf in mf_map.items():
-            try:
-                mf_map_float[lum] = float(mf)
-            except Exception:
-                continue
+        tokens = [t for t in re.split(r'[_\s.\-]+', street) if t and t not in mapping]
+        road_type = "_".join(tokens) or "Nieokreślone"
+        return arrangement, lanes, road_type
 
-        mf_series = df['lum_key'].map(mf_map_float).fillna(0.8).astype(float)
-        multiplier = mf_series / 0.8
-        mask = multiplier != 1.0
+    def apply_custom_mf(self, df, mf_map, verbose=True):
+        """Przelicza parametry świetlne na podstawie MF wybranego przez użytkownika.
 
-        if mask.any():
-            cols_to_adjust = ['Lav [cd/m2]', 'Eav [lx]', 'Emin [lx]', 'Emax [lx]', 'Lmin [cd/m2]',
-                              'Lmax [cd/m2]']
-            for col in cols_to_adjust:
+        mf_map: klucze "Ldc name | Lamp info" z tabeli MF w GUI albo id opraw
+        z katalogu (_resolve_mf_map). Oprawa wiersza to para kodów kolumn
+        słownikowanych 'Ldc name' i 'Lamp info' - mnożnik pobieramy z małej
+        tablicy [kod nazwy, kod lampy] (gather), bez sklejania napisów.
+        """
+        mf_by_id = self._resolve_mf_map(mf_map)
+        if not mf_by_id:
+            return df
+
+        slots, multipliers, slot_ids = self._mf_slots(df, mf_by_id)
+        rows = np.flatnonzero(slots)
+
+        # Logujemy tylko zmienione MF dla opraw, które występują w chunce
+        if verbose and len(rows):
+            by_id = self._luminaire_by_id()
+            for slot, n in enumerate(np.bincount(slots[rows], minlength=len(slot_ids))):
+                if slot and n:
+                    lum = by_id[slot_ids[slot]]
+                    lum_name = self._luminaire_key(lum["Ldc name"], lum["Lamp info"])
+                    self.log(f"  ∟ Korekta fotometrii: {lum_name[:40]}... -> MF: {mf_by_id[slot_ids[slot]]} "
+                             f"(x{multipliers[slot]:.2f})", "info")
+
+        if len(rows):
+            row_multiplier = multipliers[slots[rows]]
+            for col in MF_COLUMNS:
                 if col in df.columns:
-                    df.loc[mask, col] = df.loc[mask, col].mul(multiplier[mask], axis=0)
+                    values = df[col].to_numpy().copy()
+                    # Iloczyn w float64 i powrót do typu kolumny - jak dotychczasowe .mul na Series
+                    values[rows] = (values[rows] * row_multiplier).astype(values.dtype)
+                    df[col] = values
 
         return df
 
-    def label_norms_vectorized(self, df):
-        """Oblicza stopień spełnienia normy (30 kolumn) i klasyfikuje warianty"""
+    def _mf_slots(self, df, mf_by_id):
+        """Numer pozycji MF (0 = bez korekty) dla każdego wiersza oraz tablica mnożników.
+
+        Napisy porównujemy tylko na poziomie kategorii (kilkadziesiąt opraw),
+        a wiersze dostają pozycję przez indeksowanie tablicy kodami kategorii.
+        Zwraca (pozycje wierszy, mnożniki pozycji, id oprawy pozycji).
+        """
+        ldc = df['Ldc name'] if isinstance(df['Ldc name'].dtype, pd.CategoricalDtype) \
+            else df['Ldc name'].astype('category')
+        lamp = df['Lamp info'] if isinstance(df['Lamp info'].dtype, pd.CategoricalDtype) \
+            else df['Lamp info'].astype('category')
+        ldc_index = {str(name): i for i, name in enumerate(ldc.cat.categories)}
+        lamp_index = {str(info): j for j, info in enumerate(lamp.cat.categories)}
+
+        # Ostatni wiersz/kolumna tablicy obsługuje kod -1 (brak wartości)
+        table = np.zeros((len(ldc_index) + 1, len(lamp_index) + 1), dtype=np.int32)
+        multipliers = [1.0]
+        slot_ids = [None]
+        by_id = self._luminaire_by_id()
+        for lum_id, mf in mf_by_id.items():
+            lum = by_id.get(lum_id)
+            if lum is None:
+                continue
+            i = ldc_index.get(lum["Ldc name"])
+            j = lamp_index.get(lum["Lamp info"])
+            if i is None or j is None:
+                continue
+            table[i, j] = len(multipliers)
+            multipliers.append(mf / REFERENCE_MF)
+            slot_ids.append(lum_id)
+
+        slots = table[ldc.cat.codes.to_numpy(), lamp.cat.codes.to_numpy()]
+        return slots, np.array(multipliers), slot_ids
+
+    def _resolve_mf_map(self, mf_map):
+        """Zamienia mapę MF z GUI na {id oprawy z katalogu: MF}, pomijając MF równe 0.8.
+
+        Przyjmuje klucze "Ldc name | Lamp info" (tabela MF), dawne klucze
+        "Ldc name Lamp info" oraz gotowe id (int).
+        """
+        resolved = {}
+        index = None
+        for lum, mf in (mf_map or {}).items():
+            try:
+                mf = float(mf)
+            except (TypeError, ValueError):
+                continue
+            if mf == REFERENCE_MF:
+                continue
+            if isinstance(lum, (int, np.integer)):
+                resolved[int(lum)] = mf
+                continue
+            if index is None:
+                index = self._luminaire_index()
+            if lum in index:
+                resolved[index[lum]] = mf
+            else:
+                self.log(f"  ⚠ Nieznana oprawa w tabeli MF (brak w katalogu): {str(lum)[:40]}", "warning")
+        return resolved
+
+    def label_norms_vectorized(self, df, percent_columns=True):
+        """Oblicza stopień spełnienia normy (30 kolumn) i klasyfikuje warianty.
+
+        Przy percent_columns=False liczy tylko best_class - tak robi ingestia,
+        bo kolumny procentowe są wirtualne (_add_norm_columns przy odczycie).
+        """
         # 1. Mapowanie kolumn
-        col_map = {
-            'Lav': 'Lav [cd/m2]',
-            'Uo': 'Uo (L)',
-            'Ul': 'Ul',
-            'TI': 'TI [%]',
-            'Rei': 'Rei'
-        }
+        col_map = NORM_PARAMS
 
         # Sprawdzenie czy kolumny istnieją w tym pliku
         missing = [c for c in col_map.values() if c not in df.columns]
@@ -161,49 +937,129 @@ class AnalysisCalculator:
             self.log(f"  ⚠ Brak kolumn do weryfikacji norm: {missing}", "warning")
             return df
 
-        # 2. Obliczanie 30 kolumn procentowych (wektorowo - bardzo szybko)
-        for class_name, limits in NORMS.items():
-            for param, req_val in limits.items():
-                col_name = f"{param}({class_name})"
-                csv_col = col_map[param]
-
+        # 2. Obliczanie 30 kolumn procentowych - jeden broadcast na parametr (wszystkie
+        #    klasy naraz) prosto do jednej macierzy [klasa, parametr, wiersz]. Jej
+        #    spłaszczenie daje dotychczasową kolejność kolumn: klasa po klasie,
+        #    w każdej Lav, Uo, Ul, TI, Rei. Każda kolumna leży w pamięci w jednym
+        #    kawałku, więc DataFrame powstaje bez kopiowania.
+        classes = list(NORMS.keys())
+        params = list(col_map.keys())
+        measured = [df[col_map[param]].to_numpy() for param in params]
+        dtype = np.result_type(*measured, np.float32)
+        if not all(values.dtype == dtype for values in measured):
+            # Różne typy kolumn - wyrównujemy je, żeby wynik miał jeden typ
+            measured = [values.astype(dtype) for values in measured]
+
+        percents = np.empty((len(classes), len(params), len(df)), dtype=dtype) if percent_columns else None
+        passed = np.ones((len(classes), len(df)), dtype=bool)
+        for p_idx, (param, values) in enumerate(zip(params, measured)):
+            # Progi w typie kolumny (float32) - dokładnie jak skalar w działaniu pandas
+            req = np.array([NORMS[c][param] for c in classes]).astype(dtype)[:, None]
+
+            if param == 'TI':
+                # Olśnienie: im mniej, tym lepiej
+                passed &= values <= req
+            else:
+                # Jasność/Równomierność: im więcej, tym lepiej
+                passed &= values >= req
+
+            if percent_columns:
+                out = percents[:, p_idx, :]
                 if param == 'TI':
-                    # Olśnienie: im mniej, tym lepiej
-                    df[col_name] = (req_val / df[csv_col].replace(0, 0.1)) * 100
+                    np.divide(req, np.where(values == 0, dtype.type(0.1), values), out=out)
                 else:
-                    # Jasność/Równomierność: im więcej, tym lepiej
-                    df[col_name] = (df[csv_col] / req_val) * 100
-
-                df[col_name] = df[col_name].round(1)
-
-        # 3. Klasyfikacja 'best_class' (od najwyższej klasy M1 do najniższej M6)
-        df['best_class'] = "Brak"
-        for class_name in ['M6', 'M5', 'M4', 'M3', 'M2', 'M1']:
-            n = NORMS[class_name]
-            mask = (
-                    (df['Lav [cd/m2]'] >= n['Lav']) &
-                    (df['Uo (L)'] >= n['Uo']) &
-                    (df['Ul'] >= n['Ul']) &
-                    (df['TI [%]'] <= n['TI']) &
-                    (df['Rei'] >= n['Rei'])
-            )
-            df.loc[mask, 'best_class'] = class_name
+                    np.divide(values, req, out=out)
+                np.multiply(out, 100, out=out)
+                np.round(out, 1, out=out)
+
+        if percent_columns:
+            names = list(NORM_COLUMNS)
+            block = pd.DataFrame(percents.reshape(len(names), len(df)).T, columns=names,
+                                 index=df.index, copy=False)
+            existing = [c for c in names if c in df.columns]
+            df = pd.concat([df.drop(columns=existing) if existing else df, block], axis=1)
+
+        # 3. Klasyfikacja 'best_class' - pierwsza spełniona klasa w kolejności M1..M6
+        first_passed = np.where(passed.any(axis=0), passed.argmax(axis=0), len(classes))
+        df['best_class'] = self._best_class_series(first_passed, df.index)
+
+        self._log_norm_stats(first_passed, percent_columns)
+        return df
 
+    def _log_norm_stats(self, codes, percent_columns=False):
+        """Raport rozkładu klas (numery klas jak w _best_class_series) - raz na plik"""
         # --- RAPORTOWANIE DO KONSOLI ---
         # Wyciągamy statystykę klas, aby wiedzieć, co siedzi w danych
-        class_stats = df['best_class'].value_counts()
+        labels = list(NORMS) + ["Brak"]
+        counts = np.bincount(codes, minlength=len(labels))
+        class_stats = pd.Series(counts, index=labels).sort_values(ascending=False, kind='stable')
 
         # Budujemy czytelny ciąg tekstowy, np. "M3: 50, M4: 120, Brak: 1000"
         stats_str = ", ".join([f"{k}: {v}" for k, v in class_stats.items() if v > 0])
 
         # Logujemy to tylko dla pierwszego chunka pliku, żeby nie powtarzać w kółko
         if not getattr(self, 'already_logged_norms', False):
-            self.log(f"  ∟ Normy EN13201: Wygenerowano 30 kolumn wskaźnikowych.", "info")
+            if percent_columns:
+                self.log("  ∟ Normy EN13201: Wygenerowano 30 kolumn wskaźnikowych.", "info")
+            else:
+                self.log("  ∟ Normy EN13201: Klasy wyznaczone, 30 kolumn wskaźnikowych liczonych przy odczycie.", "info")
             self.log(f"  ∟ Rozkład klas: {stats_str}", "info")
             self.already_logged_norms = True
 
+    def _best_class_series(self, codes, index):
+        """Kolumna best_class z numerów klas (len(NORMS) = 'Brak'), w typie jak dotąd"""
+        labels = np.array(list(NORMS) + ["Brak"], dtype=object)
+        return pd.Series(labels[codes], index=index, dtype=pd.Series(["Brak"]).dtype)
+
+    def _reclassify(self, df):
+        """Przelicza best_class po zmianie pomiarów (np. po korekcie MF przy odczycie).
+
+        Porównania jak w label_norms_vectorized, w typie każdej kolumny.
+        """
+        classes = list(NORMS)
+        passed = np.ones((len(classes), len(df)), dtype=bool)
+        for param, col in NORM_PARAMS.items():
+            values = df[col].to_numpy()
+            dtype = np.result_type(values, np.float32)
+            req = np.array([NORMS[c][param] for c in classes]).astype(dtype)[:, None]
+            passed &= (values <= req) if param == 'TI' else (values >= req)
+        codes = np.where(passed.any(axis=0), passed.argmax(axis=0), len(classes))
+        df['best_class'] = self._best_class_series(codes, df.index)
         return df
 
+    def _add_norm_columns(self, df, names):
+        """Dolicza wirtualne kolumny procentowe (np. 'Lav(M3)') z pomiarów bazowych.
+
+        Działania i typy są te same co w label_norms_vectorized, więc wartości
+        są identyczne z kolumnami zapisywanymi dawniej w cache. Kolumny już
+        obecne w df (stary cache) zostają bez zmian. Nowe kolumny trafiają
+        przed 'best_class', jak w dotychczasowym układzie plików.
+        """
+        for name in names:
+            if name in df.columns or name not in NORM_COLUMNS:
+                continue
+            param, class_name = NORM_COLUMNS[name]
+            if NORM_PARAMS[param] not in df.columns:
+                continue
+            values = df[NORM_PARAMS[param]].to_numpy()
+            dtype = np.result_type(values, np.float32)
+            values = values.astype(dtype, copy=False)
+            req = dtype.type(NORMS[class_name][param])
+
+            if param == 'TI':
+                percent = (req / np.where(values == 0, dtype.type(0.1), values)) * 100
+            else:
+                percent = (values / req) * 100
+            loc = df.columns.get_loc('best_class') if 'best_class' in df.columns else len(df.columns)
+            df.insert(loc, name, np.round(percent, 1))
+        return df
+
+    def _virtual_norm_columns(self, stored_columns):
+        """Wirtualne kolumny procentowe możliwe do wyliczenia z kolumn zapisanych w pliku"""
+        stored = set(stored_columns)
+        return [name for name, (param, _) in NORM_COLUMNS.items()
+                if name not in stored and NORM_PARAMS[param] in stored]
+
     def calculate_efficiency_indicators(self, df, burning_hours):
         """
         Oblicza wskaźniki efektywności energetycznej Dp i De oraz Power_per_km.
@@ -226,6 +1082,11 @@ class AnalysisCalculator:
         df['De'] = df['De'].round(4)
         df['Power_per_km'] = df['Power_per_km'].round(2)
 
+        self._log_efficiency(df)
+        return df
+
+    def _log_efficiency(self, df):
+        """Raport średnich Dp, De i mocy linii - raz na plik"""
         # --- RAPORTOWANIE DO KONSOLI ---
         # Logujemy tylko raz na plik (używając flagi resetowanej w pętli głównej)
         if not getattr(self, 'already_logged_efficiency', False):
@@ -238,90 +1099,834 @@ class AnalysisCalculator:
 
             self.already_logged_efficiency = True
 
-        return df
-
     def calculate_results(self, config=None):
         """Główna pętla mielenia danych z pełnym raportowaniem statusu"""
         if not self.csv_files:
             self.log("Brak plików CSV do przetworzenia!", "error")
             return
-        self._filters_cache.clear()
-        self._filters_cache_order = []
 
-        # Pobieramy dane z configu
+        # Pobieramy dane z configu - MF i czas świecenia nie trafiają do cache,
+        # tylko ustawiają konfigurację nakładaną przy odczycie
         mf_map = config.get("mf_map", {}) if config else {}
-        burning_hours = config.get("burning_hours", 4000.0) if config else 4000.0
+        burning_hours = config.get("burning_hours", REFERENCE_BURNING_HOURS) if config else REFERENCE_BURNING_HOURS
+        workers = int(config.get("workers", 1)) if config else 1
+        if config:
+            self.query_workers = max(1, int(config.get("query_workers", workers)))
+        self.csv_engine = config.get("csv_engine", "arrow") if config else "arrow"
+        if self.csv_engine == "arrow" and pa_csv is None:
+            self.log("Brak pakietu pyarrow - używam czytnika pandas.", "warning")
+            self.csv_engine = "pandas"
+        self.cache_layout = config.get("layout", "flat") if config else "flat"
+        self.pipeline_depth = int(config.get("pipeline_depth", self.pipeline_depth)) if config else self.pipeline_depth
+        if config and config.get("memory_budget_mb"):
+            self.memory_budget_mb = float(config["memory_budget_mb"])
+        if config and config.get("result_cache_mb"):
+            self.result_cache_mb = float(config["result_cache_mb"])
+        if config and "result_spill_mb" in config:
+            self.result_spill_mb = float(config["result_spill_mb"] or 0)
+        # Nowe dane i budżety - wyniki zapytań liczymy od nowa
+        self._clear_results()
+        # Pliki większe niż range_mb są w trybie równoległym cięte na zakresy bajtów
+        range_bytes = int(float(config.get("range_mb", 128)) * 1024 * 1024) if config else 128 * 1024 * 1024
 
         self.log("ROZPOCZĘTO PROCES KONWERSJI I ANALIZY", "header")
         self.log(f"Pliki: {len(self.csv_files)} | Czas świecenia: {burning_hours}h", "info")
 
         start_total = time.time()
+        self.stats = _IngestStats()
+
+        # Pomijamy pliki, których zawartość i konfiguracja nie zmieniły się od ostatniego przebiegu
+        manifest = self._load_manifest()
+        config_key = self._ingest_config_key()
+        jobs = []
+        skipped = 0
+        for csv_path in self.csv_files:
+            file_cache_path = self._cache_folder_path(csv_path)
+            fingerprint = self._file_fingerprint(csv_path)
+            entry = manifest["entries"].get(os.path.basename(file_cache_path))
+            if (entry and entry.get("fingerprint") == fingerprint and entry.get("config") == config_key
+                    and os.path.isdir(file_cache_path)):
+                skipped += 1
+                continue
+            jobs.append((csv_path, file_cache_path, fingerprint))
 
-        for idx, csv_path in enumerate(self.csv_files):
-            # --- RESET FLAG LOGOWANIA DLA KAŻDEGO PLIKU ---
-            self.already_logged_mf = False
-            self.already_logged_norms = False
-            self.already_logged_efficiency = False
+        if skipped:
+            self.log(f"Bez zmian: {skipped} plików - używam istniejącego cache", "info")
 
-            import hashlib
-            file_name = os.path.basename(csv_path)
-            base_name = os.path.splitext(file_name)[0]
-            # Unikamy nadpisywania cache, gdy istnieją pliki o tej samej nazwie
-            path_hash = hashlib.md5(csv_path.encode("utf-8")).hexdigest()[:8]
-            folder_name = f"{base_name}_{path_hash}"
-            file_cache_path = os.path.join(self.cache_dir, folder_name)
+        if workers > 1 and jobs:
+            self._calculate_results_parallel(jobs, workers, range_bytes, manifest, config_key)
+        else:
+            for idx, (csv_path, file_cache_path, fingerprint) in enumerate(jobs):
+                self.log(f"Plik {idx + 1}/{len(jobs)}: {os.path.basename(csv_path)}", "success")
+                expected = self._checkpoint_header(fingerprint, config_key, "chunks",
+                                                   self._estimate_chunk_bytes(csv_path))
+                staging_path, checkpoint = self._prepare_staging_folder(file_cache_path, expected)
+                total_rows = self._convert_csv_file(csv_path, staging_path, checkpoint)
+                if total_rows is not None:
+                    self._commit_cache_folder(manifest, csv_path, file_cache_path, fingerprint, config_key,
+                                              total_rows)
+
+        # MF rozwiązujemy na id opraw dopiero teraz - katalog zna już oprawy nowych plików
+        self.set_active_config(mf_map, burning_hours)
 
-            self.log(f"Plik {idx + 1}/{len(self.csv_files)}: {file_name}", "success")
-            start_file = time.time()
+        end_total = time.time()
+        self._report_stages(end_total - start_total, workers)
+        self.log(f"PROCES ZAKOŃCZONY W {end_total - start_total:.2f}s", "header")
+        self.log("Dane gotowe do wizualizacji w panelu końcowym.", "success")
 
-            if not os.path.exists(file_cache_path):
-                os.makedirs(file_cache_path)
+    def set_active_config(self, mf_map=None, burning_hours=None):
+        """Ustawia MF i czas świecenia nakładane przy odczycie - bez ponownego przeliczania CSV.
 
-            try:
-                # Czytamy CSV w kawałkach (chunks)
-                chunks = pd.read_csv(csv_path, sep=';', chunksize=500000, low_memory=False, encoding='cp1252')
+        Zapamiętujemy tylko MF różne od 0.8, jako {id oprawy z katalogu: MF}.
+        Wyniki zapytań są w pamięci podręcznej pod kluczem zawierającym
+        konfigurację, więc kilka wariantów może współistnieć na tych samych
+        danych bazowych.
+        """
+        self.active_mf = self._resolve_mf_map(mf_map)
+        if burning_hours is not None:
+            self.active_burning_hours = float(burning_hours)
+
+    def _active_config_key(self):
+        return tuple(sorted(self.active_mf.items())), self.active_burning_hours
+
+    def _active_config_columns(self, wanted):
+        """Kolumny bazowe, których _apply_active_config potrzebuje dla kolumn wanted"""
+        extra = []
+        if self.active_mf:
+            extra += ['Ldc name', 'Lamp info']
+            if 'best_class' in wanted:
+                extra += list(NORM_PARAMS.values())
+        if self.active_burning_hours != REFERENCE_BURNING_HOURS and 'De' in wanted:
+            extra += ['Total power [W]', 'A [m2]']
+        return extra
+
+    def _apply_active_config(self, df):
+        """Nakłada aktywną konfigurację na dane bazowe z cache.
+
+        MF: skaluje kolumny fotometryczne opraw z MF różnym od 0.8 i przelicza
+        best_class. Czas świecenia: liczy De tym samym wzorem co
+        calculate_efficiency_indicators, więc wynik jest identyczny
+        z dawnym "wypalaniem" konfiguracji w cache. Brakujące kolumny pomijamy.
+        """
+        if self.active_mf and {'Ldc name', 'Lamp info'} <= set(df.columns):
+            df = self.apply_custom_mf(df, self.active_mf, verbose=False)
+            if 'best_class' in df.columns and all(c in df.columns for c in NORM_PARAMS.values()):
+                df = self._reclassify(df)
+        if (self.active_burning_hours != REFERENCE_BURNING_HOURS
+                and {'De', 'Total power [W]', 'A [m2]'} <= set(df.columns)):
+            df['De'] = ((df['Total power [W]'] * self.active_burning_hours) / (df['A [m2]'] * 1000)).round(4)
+        return df
+
+    def _cache_folder_path(self, csv_path):
+        """Zwraca folder cache dla pliku CSV: data_cache/<nazwa>_<hash ścieżki>"""
+        base_name = os.path.splitext(os.path.basename(csv_path))[0]
+        # Unikamy nadpisywania cache, gdy istnieją pliki o tej samej nazwie
+        path_hash = hashlib.md5(csv_path.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f"{base_name}_{path_hash}")
+
+    def _load_manifest(self):
+        """Wczytuje manifest cache (pusty, jeśli nie istnieje lub jest uszkodzony)"""
+        try:
+            with open(self._manifest_file, "r", encoding="utf-8") as fh:
+                manifest = json.load(fh)
+            if manifest.get("version") == CACHE_FORMAT_VERSION:
+                return manifest
+        except Exception:
+            pass
+        return {"version": CACHE_FORMAT_VERSION, "entries": {}}
+
+    def _save_manifest(self, manifest):
+        """Zapisuje manifest atomowo (plik tymczasowy + os.replace)"""
+        tmp_file = self._manifest_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=1, ensure_ascii=False)
+        os.replace(tmp_file, self._manifest_file)
+
+    def _file_fingerprint(self, csv_path, edge_bytes=1 << 20, block_bytes=1 << 16, n_blocks=32):
+        """Szybki odcisk zawartości pliku: rozmiar, czas modyfikacji + skrót z początku, końca i bloków ze środka.
+
+        Czyta ok. 4 MB niezależnie od wielkości pliku, więc sprawdzenie
+        kilkunastu eksportów po 17 mln wierszy trwa ułamek sekundy. Próbki
+        nie obejmują całego pliku, dlatego odcisk zawiera też st_mtime_ns -
+        ponowny eksport tej samej wielkości, zmieniony tylko poza próbkami,
+        też jest wykrywany (kosztem ponownej konwersji po samym "touch").
+        """
+        stat = os.stat(csv_path)
+        size = stat.st_size
+        digest = hashlib.blake2b(f"{size}:{stat.st_mtime_ns}".encode(), digest_size=16)
+        with open(csv_path, 'rb') as fh:
+            digest.update(fh.read(edge_bytes))
+            for k in range(1, n_blocks + 1):
+                fh.seek(size * k // (n_blocks + 1))
+                digest.update(fh.read(block_bytes))
+            fh.seek(max(0, size - edge_bytes))
+            digest.update(fh.read(edge_bytes))
+        return digest.hexdigest()
+
+    def _ingest_config_key(self):
+        """Skrót konfiguracji, która wpływa na zawartość cache.
+
+        MF i czas świecenia są nakładane przy odczycie, więc ich zmiana nie
+        unieważnia cache - liczą się tylko kolumny i układ plików.
+        """
+        payload = {
+            "version": CACHE_FORMAT_VERSION,
+            "columns": self.chosen_columns,
+            "layout": self.cache_layout,
+        }
+        return hashlib.md5(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
 
-                total_rows = 0
-                for i, chunk in enumerate(chunks):
-                    # 1. Dekodowanie układu (loguje geometrię)
-                    chunk = self.decode_arrangement(chunk)
+    def _staging_folder_path(self, file_cache_path):
+        """Folder roboczy obok docelowego - kropka na początku ukrywa go przed glob('**/*.parquet')"""
+        parent, name = os.path.split(file_cache_path)
+        return os.path.join(parent, f".{name}.tmp")
 
-                    # 2. Aplikacja MF (loguje zmianę współczynnika)
-                    chunk = self.apply_custom_mf(chunk, mf_map)
+    def _checkpoint_header(self, fingerprint, config_key, mode, chunk_bytes):
+        """Część checkpointu, która musi się zgadzać, żeby wznowić pracę w folderze roboczym"""
+        return {"fingerprint": fingerprint, "config": config_key, "mode": mode, "chunk_bytes": chunk_bytes}
 
-                    # 3. Liczenie norm (loguje rozkład klas M1-M6)
-                    chunk = self.label_norms_vectorized(chunk)
+    def _prepare_staging_folder(self, file_cache_path, expected):
+        """Przygotowuje folder roboczy dla nowych part_i.parquet.
 
-                    # 4. Obliczanie wskaźników (loguje De, Dp i moc linii)
-                    chunk = self.calculate_efficiency_indicators(chunk, burning_hours)
+        Jeśli po przerwanym przebiegu został folder z checkpointem dla tego samego
+        pliku, konfiguracji i podziału na kawałki, zachowujemy gotowe części
+        i zwracamy checkpoint do wznowienia. W przeciwnym razie zaczynamy od zera.
+        Zwraca (ścieżka folderu, checkpoint).
+        """
+        staging_path = self._staging_folder_path(file_cache_path)
+        checkpoint = self._load_checkpoint(staging_path)
+        if checkpoint and all(checkpoint.get(k) == v for k, v in expected.items()):
+            return staging_path, checkpoint
+
+        if os.path.exists(staging_path):
+            shutil.rmtree(staging_path)
+        os.makedirs(staging_path)
+        checkpoint = dict(expected)
+        self._save_checkpoint(staging_path, checkpoint)
+        return staging_path, checkpoint
+
+    def _load_checkpoint(self, staging_path):
+        try:
+            with open(os.path.join(staging_path, "_checkpoint.json"), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except Exception:
+            return None
 
-                    # 5. Zapis do Parquet
-                    chunk.to_parquet(os.path.join(file_cache_path, f"part_{i}.parquet"), index=False)
+    def _save_checkpoint(self, staging_path, checkpoint):
+        """Zapisuje checkpoint atomowo - przerwanie w trakcie zapisu nie psuje poprzedniego"""
+        checkpoint_file = os.path.join(staging_path, "_checkpoint.json")
+        with open(checkpoint_file + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(checkpoint, fh)
+        os.replace(checkpoint_file + ".tmp", checkpoint_file)
+
+    def _read_done_marker(self, staging_path, part_idx):
+        """Liczba rekordów zapisana w znaczniku ukończonej części"""
+        with open(os.path.join(staging_path, f"_part_{part_idx}.done"), "r") as fh:
+            return int(fh.read().strip() or 0)
+
+    def _estimate_chunk_bytes(self, csv_path, sample_bytes=1 << 20):
+        """Szacuje rozmiar kawałka w bajtach odpowiadający self.chunk_rows wierszom"""
+        header, data_start = _read_header_bytes(csv_path)
+        with open(csv_path, 'rb') as fh:
+            fh.seek(data_start)
+            sample = fh.read(sample_bytes)
+        n_lines = max(1, sample.count(b"\n"))
+        return max(1 << 16, int(len(sample) / n_lines * self.chunk_rows))
+
+    def _commit_cache_folder(self, manifest, csv_path, file_cache_path, fingerprint, config_key, total_rows):
+        """Podmienia folder cache na świeżo przeliczony i zapisuje wpis w manifeście.
+
+        Stary folder jest najpierw odsuwany na bok, więc po podmianie nie
+        zostają w nim osierocone part_N.parquet z dłuższej wersji pliku.
+        """
+        staging_path = self._staging_folder_path(file_cache_path)
+        done_markers = glob.glob(os.path.join(staging_path, "_part_*.done"))
+        n_parts = len(done_markers)
+        try:
+            self._write_summary_cube(staging_path, [
+                os.path.basename(m)[len("_part_"):-len(".done")] for m in done_markers])
+        except Exception as e:
+            self.log(f"  ⚠ Nie udało się zbudować kostki agregatów: {e}", "warning")
+        for marker in done_markers + glob.glob(os.path.join(staging_path, "_cube_part_*.parquet")) + [
+                os.path.join(staging_path, "_checkpoint.json")]:
+            if os.path.exists(marker):
+                os.remove(marker)
+        parent, name = os.path.split(file_cache_path)
+        old_path = os.path.join(parent, f".{name}.old")
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+        if os.path.exists(file_cache_path):
+            os.replace(file_cache_path, old_path)
+        os.replace(staging_path, file_cache_path)
+        if os.path.exists(old_path):
+            shutil.rmtree(old_path)
+
+        manifest["entries"][name] = {
+            "source": csv_path,
+            "fingerprint": fingerprint,
+            "size": os.path.getsize(csv_path),
+            "config": config_key,
+            "rows": total_rows,
+            "parts": n_parts,
+            "layout": self.cache_layout,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self._save_manifest(manifest)
 
-                    total_rows += len(chunk)
+        # Aktualizujemy katalog opraw z gotowych części - okno MF nie musi już czytać CSV
+        try:
+            catalog = self._load_luminaire_catalog()
+            self._register_luminaire_counts(catalog, csv_path, fingerprint,
+                                            self._count_luminaires_in_cache(file_cache_path))
+            self._save_luminaire_catalog(catalog)
+        except Exception as e:
+            self.log(f"  ⚠ Nie udało się zaktualizować katalogu opraw: {e}", "warning")
 
-                end_file = time.time()
-                self.log(f"   ∟ Sukces: {total_rows} rekordów w {end_file - start_file:.2f}s", "info")
+    def _convert_csv_file(self, csv_path, staging_path, checkpoint):
+        """Konwertuje jeden plik CSV do part_i.parquet. Zwraca liczbę rekordów (None przy błędzie)."""
+        # --- RESET FLAG LOGOWANIA DLA KAŻDEGO PLIKU ---
+        self.already_logged_mf = False
+        self.already_logged_norms = False
+        self.already_logged_efficiency = False
 
-            except Exception as e:
-                self.log(f"Błąd krytyczny pliku {file_name}: {str(e)}", "error")
+        file_name = os.path.basename(csv_path)
+        self._stats_file = file_name
+        start_file = time.time()
 
-        end_total = time.time()
-        self.log(f"PROCES ZAKOŃCZONY W {end_total - start_total:.2f}s", "header")
-        self.log("Dane gotowe do wizualizacji w panelu końcowym.", "success")
+        try:
+            total_rows = self._convert_csv_chunks(csv_path, staging_path, checkpoint)
 
-    def get_unique_items(self):
-        """Wyciąga unikalne wartości używając poprawnych nazw kolumn z Parquet"""
-        import glob
-        import os
-        import pandas as pd
-        import json
+            end_file = time.time()
+            self.log(f"   ∟ Sukces: {total_rows} rekordów w {end_file - start_file:.2f}s", "info")
+            peak = _peak_rss_bytes()
+            if peak is not None:
+                self.log(f"   ∟ Szczyt pamięci procesu (RSS): {peak / (1024 * 1024):.0f} MB", "info")
+            return total_rows
+
+        except Exception as e:
+            self.log(f"Błąd krytyczny pliku {file_name}: {str(e)}", "error")
+            return None
+
+    def _convert_csv_chunks(self, csv_path, staging_path, checkpoint):
+        """Czyta plik kolejnymi zakresami bajtów, przelicza je i zapisuje jako part_i.parquet.
+
+        Po każdym kawałku checkpoint zapamiętuje numer następnej części i pozycję
+        w pliku źródłowym, więc wznowiony przebieg przeskakuje (seek) od razu
+        do nieprzetworzonych danych. Zwraca łączną liczbę rekordów.
+        """
+        header, data_start = _read_header_bytes(csv_path)
+        part_idx = checkpoint.get("next_part", 0)
+        offset = checkpoint.get("offset", data_start)
+        total_rows = checkpoint.get("rows", 0)
+
+        if part_idx:
+            size = os.path.getsize(csv_path)
+            self.log(f"  ∟ Wznowienie od części {part_idx} ({offset / max(size, 1) * 100:.1f}% pliku, "
+                     f"{total_rows} rekordów gotowych)", "info")
+        self._discard_parts_from(staging_path, part_idx)
+
+        # Rozmiar kawałka: z chunk_rows albo - przy znanym budżecie pamięci - dobierany
+        # po pierwszym kawałku (_adapt_chunk_size). Checkpoint pamięta pozycję w pliku
+        # i dobrany rozmiar, więc wznowienie czyta dalej takimi samymi kawałkami.
+        sizing = {"bytes": checkpoint["chunk_bytes"], "budget": self._memory_budget_bytes()}
+        if checkpoint.get("sizing"):
+            sizing.update(checkpoint["sizing"])
+        elif sizing["budget"]:
+            # Pierwszy kawałek ostrożnie - tekst CSV zajmuje zwykle więcej niż typowane kolumny
+            sizing["bytes"] = max(1 << 16, min(sizing["bytes"], sizing["budget"] // self._chunks_in_flight()))
+        ranges = _iter_byte_ranges(csv_path, offset, lambda: sizing["bytes"])
+        if self.pipeline_depth > 0:
+            return self._convert_csv_pipeline(csv_path, header, ranges, staging_path, checkpoint,
+                                              part_idx, total_rows, sizing)
+
+        for start, end in ranges:
+            chunk = self._read_csv_range(csv_path, header, start, end, part_idx)
+
+            # 1-4. Geometria, MF, normy i wskaźniki efektywności
+            chunk = self._transform_chunk(chunk, part_idx)
+            self._adapt_chunk_size(sizing, chunk, end - start)
+
+            # 5. Zapis do Parquet
+            self._write_chunk(chunk, staging_path, part_idx)
+
+            total_rows += len(chunk)
+            part_idx += 1
+            checkpoint.update({"next_part": part_idx, "offset": end, "rows": total_rows,
+                               "sizing": self._checkpoint_sizing(sizing)})
+            self._save_checkpoint(staging_path, checkpoint)
+        return total_rows
+
+    def _discard_parts_from(self, staging_path, part_idx):
+        """Usuwa z folderu roboczego części o numerach >= part_idx (razem z ich znacznikami i kostkami).
+
+        Przerwany zapis kawałka w układzie "hive" mógł zostawić part_i.parquet
+        w części katalogów partycji. Wznowiony kawałek może trafić do innych
+        katalogów, więc bez sprzątania stare pliki dublowałyby wiersze.
+        """
+        leftovers = (glob.glob(os.path.join(staging_path, "**", "part_*.parquet*"), recursive=True)
+                     + glob.glob(os.path.join(staging_path, "_part_*.done"))
+                     + glob.glob(os.path.join(staging_path, "_cube_part_*.parquet*")))
+        for path in leftovers:
+            match = re.search(r"part_(\d+)\.", os.path.basename(path))
+            if match and int(match.group(1)) >= part_idx:
+                os.remove(path)
+
+    def _checkpoint_sizing(self, sizing):
+        """Dobrany rozmiar kawałka do zapisania w checkpoincie (bez budżetu - ten liczymy na nowo)"""
+        return {k: v for k, v in sizing.items() if k in ("bytes", "rows")}
+
+    def _memory_budget_bytes(self):
+        """Budżet pamięci ingestii w bajtach (None, gdy nie jest ustawiony ani znany)"""
+        if self.memory_budget_mb:
+            return int(self.memory_budget_mb * 1024 * 1024)
+        available = _available_memory_bytes()
+        return available // 2 if available else None
+
+    def _chunks_in_flight(self):
+        """Ile kawałków może być jednocześnie w pamięci (plus jeden na pośrednie tablice obliczeń)"""
+        if self.pipeline_depth > 0:
+            return 2 * self.pipeline_depth + 3 + 1
+        return 2
+
+    def _adapt_chunk_size(self, sizing, chunk, csv_bytes):
+        """Po pierwszym kawałku ustala rozmiar kolejnych tak, żeby zmieściły się w budżecie.
+
+        Mierzymy bajty na wiersz w pamięci (po obliczeniach, razem z kolumnami
+        pochodnymi) i bajty na wiersz w CSV, a budżet dzielimy przez liczbę
+        kawałków, które potok trzyma jednocześnie.
+        """
+        if not sizing["budget"] or sizing.get("rows") or not len(chunk):
+            return
+        mem_per_row = chunk.memory_usage(deep=True).sum() / len(chunk)
+        rows = int(sizing["budget"] / (mem_per_row * self._chunks_in_flight()))
+        rows = min(max(rows, self.min_chunk_rows), self.max_chunk_rows)
+        sizing["rows"] = rows
+        sizing["bytes"] = max(1 << 16, int(rows * csv_bytes / len(chunk)))
+        self.log(f"  ∟ Kawałki: ~{rows} wierszy ({sizing['bytes'] / (1024 * 1024):.0f} MB CSV, "
+                 f"{mem_per_row:.0f} B/wiersz w pamięci, budżet {sizing['budget'] / (1024 * 1024):.0f} MB)",
+                 "info")
+
+    def _convert_csv_pipeline(self, csv_path, header, ranges, staging_path, checkpoint, part_idx, total_rows,
+                              sizing):
+        """Ta sama konwersja co w _convert_csv_chunks, ale jako potok trzech etapów.
+
+        Wątek czytający parsuje kolejne zakresy bajtów, bieżący wątek je
+        przelicza, a wątek zapisujący zapisuje części i checkpoint (po kolei,
+        więc wznowienie działa jak dotąd). Czytnik Arrow i zapis Parquet
+        zwalniają GIL, więc dysk i CPU pracują równocześnie. Kolejki mają
+        rozmiar pipeline_depth - gdy zapis nie nadąża, czytanie czeka, więc
+        w pamięci jest najwyżej ok. 2 * pipeline_depth + 3 kawałków.
+        Rozmiar kawałków po pierwszym z nich dobiera _adapt_chunk_size.
+
+        Po błędzie w dowolnym etapie pozostałe etapy tylko opróżniają
+        kolejki do znacznika końca, a błąd jest zgłaszany dalej.
+        """
+        done = object()
+        read_queue = queue.Queue(maxsize=self.pipeline_depth)
+        write_queue = queue.Queue(maxsize=self.pipeline_depth)
+        failed = threading.Event()
+        errors = []
+        state = {"part_idx": part_idx, "rows": total_rows}
+
+        def reader():
+            try:
+                for read_idx, (start, end) in enumerate(ranges, part_idx):
+                    if failed.is_set():
+                        break
+                    read_queue.put((start, end, self._read_csv_range(csv_path, header, start, end, read_idx)))
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+            finally:
+                read_queue.put(done)
+
+        def writer():
+            while True:
+                item = write_queue.get()
+                if item is done:
+                    return
+                if failed.is_set():
+                    continue
+                try:
+                    end, chunk = item
+                    self._write_chunk(chunk, staging_path, state["part_idx"])
+                    state["rows"] += len(chunk)
+                    state["part_idx"] += 1
+                    checkpoint.update({"next_part": state["part_idx"], "offset": end, "rows": state["rows"],
+                                       "sizing": self._checkpoint_sizing(sizing)})
+                    self._save_checkpoint(staging_path, checkpoint)
+                except BaseException as e:
+                    errors.append(e)
+                    failed.set()
+
+        threads = [threading.Thread(target=reader, name="csv-reader", daemon=True),
+                   threading.Thread(target=writer, name="parquet-writer", daemon=True)]
+        for thread in threads:
+            thread.start()
         try:
-            import pyarrow.parquet as pq
-        except Exception:
-            pq = None
+            transform_idx = part_idx
+            while True:
+                item = read_queue.get()
+                if item is done:
+                    break
+                if failed.is_set():
+                    continue
+                try:
+                    start, end, chunk = item
+                    # 1-4. Geometria, MF, normy i wskaźniki efektywności
+                    chunk = self._transform_chunk(chunk, transform_idx)
+                    transform_idx += 1
+                    self._adapt_chunk_size(sizing, chunk, end - start)
+                    write_queue.put((end, chunk))
+                except BaseException as e:
+                    errors.append(e)
+                    failed.set()
+        finally:
+            write_queue.put(done)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+        return state["rows"]
+
+    def _write_chunk(self, chunk, staging_path, part_idx):
+        """Zapisuje przeliczony kawałek jako część part_i i oznacza ją jako gotową.
+
+        Wiersze są sortowane po kolumnach filtrów (cluster_columns) i zapisywane
+        w grupach po row_group_size, żeby filtry mogły pomijać całe grupy wierszy.
+        W układzie "hive" kawałek jest dzielony na katalogi
+        Arrangement=.../best_class=.../Road W[m]=..., dzięki czemu zapytania
+        z GUI mogą pomijać całe katalogi. Kolumny partycji zostają też
+        w plikach, więc odczyt pojedynczej części działa jak w układzie płaskim.
+        Znacznik _part_i.done (z liczbą rekordów) pozwala wznowić przerwany przebieg.
+        """
+        with self._stage("write", part_idx, _frame_bytes(chunk)) as record:
+            sort_cols = [c for c in self.cluster_columns if c in chunk.columns]
+            if sort_cols:
+                chunk = chunk.sort_values(sort_cols, kind='stable', ignore_index=True)
+
+            if self.cache_layout == "hive":
+                part_paths = []
+                for values, group in chunk.groupby(self.partition_columns, observed=True, dropna=False,
+                                                   sort=False):
+                    folder = os.path.join(staging_path, *[
+                        f"{col}={self._partition_value(v)}" for col, v in zip(self.partition_columns, values)])
+                    os.makedirs(folder, exist_ok=True)
+                    part_paths.append(os.path.join(folder, f"part_{part_idx}.parquet"))
+                    _write_part(group, part_paths[-1], self.row_group_size)
+            else:
+                part_paths = [os.path.join(staging_path, f"part_{part_idx}.parquet")]
+                _write_part(chunk, part_paths[0], self.row_group_size)
+            record["rows"] = len(chunk)
+            record["bytes_out"] = sum(os.path.getsize(p) for p in part_paths)
+
+        # Częściowa kostka agregatów z kawałka, który i tak jest w pamięci - przy
+        # zatwierdzaniu folderu wystarczy je zsumować zamiast czytać części od nowa
+        try:
+            with self._stage("cube", part_idx, _frame_bytes(chunk)) as record:
+                cube_path = os.path.join(staging_path, f"_cube_part_{part_idx}.parquet")
+                _write_part(self._chunk_cube(chunk), cube_path)
+                record["rows"] = len(chunk)
+                record["bytes_out"] = os.path.getsize(cube_path)
+        except Exception as e:
+            self.log(f"  ⚠ Pominięto kostkę agregatów części {part_idx}: {e}", "warning")
+
+        with open(os.path.join(staging_path, f"_part_{part_idx}.done"), "w") as fh:
+            fh.write(str(len(chunk)))
+
+    def _partition_value(self, value):
+        """Wartość partycji w nazwie katalogu (float32 w najkrótszej postaci, np. 7.5)"""
+        if isinstance(value, (float, np.floating)):
+            value = np.float32(value)
+        return urllib.parse.quote(str(value), safe=" ")
+
+    def _prune_partitioned_files(self, files, filters):
+        """Odrzuca pliki z katalogów partycji, które nie pasują do filtrów GUI (bez czytania danych)"""
+        wanted = {}
+        for nice_name, col in self.partition_filters.items():
+            val = (filters or {}).get(nice_name, "Wszystkie")
+            if val and val != "Wszystkie":
+                wanted[col] = str(val).strip()
+        if not wanted:
+            return files
+
+        kept = []
+        for file in files:
+            rel_parts = os.path.relpath(file, self.cache_dir).split(os.sep)
+            match = True
+            for segment in rel_parts[:-1]:
+                col, sep, raw = segment.partition("=")
+                if not sep or col not in wanted:
+                    continue
+                value = urllib.parse.unquote(raw)
+                try:
+                    if col == 'Road W[m]':
+                        match = np.float32(value) == np.float32(wanted[col])
+                    else:
+                        match = value == wanted[col]
+                except ValueError:
+                    match = True
+                if not match:
+                    break
+            if match:
+                kept.append(file)
+        return kept
+
+    def _read_csv_header(self, csv_path):
+        """Zwraca listę nazw kolumn z pierwszej linii pliku CSV"""
+        with open(csv_path, 'rb') as fh:
+            return self._parse_header_line(fh.readline())
+
+    def _parse_header_line(self, header):
+        line = header.decode('cp1252').rstrip('\r\n')
+        return [name.strip('"') for name in line.split(';')]
+
+    def _ingest_columns(self, header_names):
+        """Kolumny z chosen_columns, które faktycznie występują w pliku"""
+        return [c for c in self.chosen_columns if c in header_names]
+
+    def _arrow_csv_options(self, columns):
+        """Opcje czytnika Arrow: jawny schemat (float32 + kolumny słownikowe) i projekcja kolumn"""
+        read_options = pa_csv.ReadOptions(encoding='cp1252', block_size=16 * 1024 * 1024)
+        parse_options = pa_csv.ParseOptions(delimiter=';')
+        column_types = {
+            c: pa.dictionary(pa.int32(), pa.string()) if c in self.category_columns else pa.float32()
+            for c in columns
+        }
+        convert_options = pa_csv.ConvertOptions(column_types=column_types, include_columns=columns)
+        return read_options, parse_options, convert_options
+
+    def _coerce_chunk_types(self, df):
+        """Sprowadza kawałek z czytnika pandas do tego samego schematu, co czytnik Arrow"""
+        for col in df.columns:
+            if col in self.category_columns:
+                df[col] = df[col].astype('category')
+            else:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        return df
+
+    def _read_csv_range(self, csv_path, header, start, end, part_idx=None):
+        """Wczytuje zakres bajtów pliku jako DataFrame (z doklejonym nagłówkiem) i mierzy etap "read" """
+        with self._stage("read", part_idx, end - start) as record:
+            df = self._parse_csv_range(csv_path, header, start, end)
+            if self.stats is not None:
+                record["rows"] = len(df)
+                record["bytes_out"] = _frame_bytes(df)
+        return df
+
+    def _parse_csv_range(self, csv_path, header, start, end):
+        """Parsuje zakres bajtów pliku czytnikiem Arrow (albo pandas, gdy Arrow odrzuci dane)"""
+        with open(csv_path, 'rb') as fh:
+            fh.seek(start)
+            data = fh.read(end - start)
+        columns = self._ingest_columns(self._parse_header_line(header))
 
-        all_files = glob.glob(os.path.join(self.cache_dir, "**", "*.parquet"), recursive=True)
+        if self.csv_engine == "arrow":
+            try:
+                read_options, parse_options, convert_options = self._arrow_csv_options(columns)
+                table = pa_csv.read_csv(io.BytesIO(header + data), read_options=read_options,
+                                        parse_options=parse_options, convert_options=convert_options)
+                return table.to_pandas()
+            except pa.ArrowInvalid as e:
+                self.log(f"  ⚠ Czytnik Arrow odrzucił zakres ({e}) - ponawiam przez pandas", "warning")
+
+        df = pd.read_csv(io.BytesIO(header + data), sep=';', low_memory=False, encoding='cp1252',
+                         usecols=columns)
+        return self._coerce_chunk_types(df)
+
+    def _transform_chunk(self, chunk, part_idx=None):
+        """Przepuszcza jeden kawałek danych przez cały łańcuch obliczeń.
+
+        Cache jest niezależny od konfiguracji: fotometria zostaje przy MF
+        odniesienia, a De jest liczone dla REFERENCE_BURNING_HOURS. MF
+        i czas świecenia użytkownika nakłada _apply_active_config przy odczycie.
+        Każdy krok jest mierzony jako osobny etap (part_idx - numer części w raporcie).
+        """
+        # 1. Dekodowanie układu (loguje geometrię)
+        chunk = self._timed_step("decode", part_idx, self.decode_arrangement, chunk)
+
+        # 2. MF nie jest aplikowane przy ingestii (patrz _apply_active_config)
+
+        # 3-4. Normy i wskaźniki w jednym przebiegu po tablicach float32
+        if self.transform_engine == "fused" and self._fused_inputs_ok(chunk):
+            return self._timed_step("fused", part_idx, self._transform_fused, chunk)
+
+        # 3. Liczenie norm (loguje rozkład klas M1-M6)
+        #    (kolumny procentowe są wirtualne - w cache zostaje tylko best_class)
+        chunk = self._timed_step("norms", part_idx, self.label_norms_vectorized, chunk, percent_columns=False)
+
+        # 4. Obliczanie wskaźników (loguje De, Dp i moc linii)
+        chunk = self._timed_step("efficiency", part_idx, self.calculate_efficiency_indicators, chunk,
+                                 REFERENCE_BURNING_HOURS)
+        return chunk
+
+    def _stage(self, name, part_idx, bytes_in=0):
+        """Kontekst pomiaru etapu ingestii (bez pomiaru, gdy self.stats nie jest ustawione)"""
+        if self.stats is None:
+            return contextlib.nullcontext({})
+        return self.stats.stage(self._stats_file, part_idx, name, bytes_in)
+
+    def _timed_step(self, name, part_idx, fn, chunk, *args, **kwargs):
+        """Wywołuje krok obliczeń na kawałku i zapisuje jego pomiar"""
+        with self._stage(name, part_idx, _frame_bytes(chunk) if self.stats else 0) as record:
+            chunk = fn(chunk, *args, **kwargs)
+            if self.stats is not None:
+                record["rows"] = len(chunk)
+                record["bytes_out"] = _frame_bytes(chunk)
+        return chunk
+
+    def _report_stages(self, elapsed, workers):
+        """Krótkie podsumowanie etapów w konsoli i raport _run_report.json/.csv obok cache"""
+        if self.stats is None or not self.stats.records:
+            return
+        summary = self.stats.summary()
+        busy = sum(s["seconds"] for s in summary) or 1.0
+        mb = 1024 * 1024
+        self.log("Etapy ingestii (czas sumowany po kawałkach - w potoku i procesach etapy się nakładają):",
+                 "info")
+        for s in summary:
+            rate = f"{s['rows_per_s'] / 1e6:.2f} mln wierszy/s" if s["rows_per_s"] else "-"
+            peak = f", szczyt RSS {s['rss_peak'] / mb:.0f} MB" if s["rss_peak"] else ""
+            self.log(f"  ∟ {s['stage']}: {s['seconds']:.2f}s ({s['seconds'] / busy * 100:.0f}%), {rate}, "
+                     f"{s['bytes_in'] / mb:.0f} → {s['bytes_out'] / mb:.0f} MB{peak}", "info")
+
+        report = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_seconds": elapsed,
+            "settings": {"workers": workers, "csv_engine": self.csv_engine, "layout": self.cache_layout,
+                         "transform_engine": self.transform_engine, "pipeline_depth": self.pipeline_depth,
+                         "memory_budget_mb": self.memory_budget_mb},
+            "stages": summary,
+            "chunks": self.stats.records,
+        }
+        try:
+            with open(os.path.join(self.cache_dir, "_run_report.json"), "w", encoding="utf-8") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=1)
+            with open(os.path.join(self.cache_dir, "_run_report.csv"), "w", encoding="utf-8", newline="") as fh:
+                writer = csv.DictWriter(fh, fieldnames=["file", "part", "stage", "rows", "seconds", "bytes_in",
+                                                        "bytes_out", "rss_peak"], delimiter=';')
+                writer.writeheader()
+                writer.writerows(self.stats.records)
+        except OSError as e:
+            self.log(f"  ⚠ Nie udało się zapisać raportu przebiegu: {e}", "warning")
+
+    def _fused_inputs_ok(self, chunk):
+        """Jądro scalone wymaga wszystkich kolumn wejściowych w float32"""
+        return all(c in chunk.columns and chunk[c].dtype == np.float32 for c in FUSED_INPUT_COLUMNS)
+
+    def _transform_fused(self, chunk):
+        """Kroki 3-4 łańcucha (best_class, A, Dp, De, Power_per_km) jednym jądrem.
+
+        Z numbą jest to jedna pętla po wierszach, bez tablic pośrednich;
+        bez numby - wersja NumPy z tymi samymi działaniami w float32. Wyniki
+        są identyczne z label_norms_vectorized + calculate_efficiency_indicators
+        (tests/test_fused_kernel.py).
+        """
+        arrays = [np.ascontiguousarray(chunk[c].to_numpy()) for c in FUSED_INPUT_COLUMNS]
+        kernel = _fused_kernel_jit if _fused_kernel_jit is not None else _fused_kernel_numpy
+        codes, area, dp, de, power_per_km = kernel(*arrays, _norm_requirements(),
+                                                   np.float32(REFERENCE_BURNING_HOURS))
+
+        chunk['best_class'] = self._best_class_series(codes, chunk.index)
+        self._log_norm_stats(codes)
+        chunk['A [m2]'] = area
+        chunk['Dp'] = dp
+        chunk['De'] = de
+        chunk['Power_per_km'] = power_per_km
+        self._log_efficiency(chunk)
+        return chunk
+
+    def _calculate_results_parallel(self, jobs, workers, range_bytes, manifest, config_key):
+        """Konwertuje pliki CSV w osobnych procesach.
+
+        Małe pliki trafiają do procesu w całości, a duże są cięte na zakresy
+        bajtów (każdy zakres to osobny part_i.parquet), więc nawet jeden
+        ogromny plik wykorzystuje wszystkie rdzenie. Logi procesów odtwarzamy
+        w konsoli GUI w kolejności plików, jak w trybie szeregowym.
+        """
+        self.log(f"Tryb równoległy: {workers} procesów roboczych", "info")
+
+        # Ustawienia, które procesy robocze muszą przejąć od silnika głównego
+        # Budżet pamięci dzielimy równo między procesy
+        budget = self._memory_budget_bytes()
+        settings = {"csv_engine": self.csv_engine, "cache_layout": self.cache_layout,
+                    "transform_engine": self.transform_engine, "pipeline_depth": self.pipeline_depth,
+                    "memory_budget_mb": budget / workers / (1024 * 1024) if budget else None}
+        if self.memory_budget_mb:
+            # Zakres bajtów jest przetwarzany w całości, więc przy jawnym budżecie go ograniczamy.
+            # Tekst CSV zajmuje więcej niż typowane kolumny, więc to ostrożne oszacowanie.
+            range_bytes = min(range_bytes, max(1 << 20, int(settings["memory_budget_mb"] * 1024 * 1024 / 2)))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            file_tasks = []
+            for csv_path, file_cache_path, fingerprint in jobs:
+                if os.path.getsize(csv_path) <= range_bytes:
+                    expected = self._checkpoint_header(fingerprint, config_key, "chunks",
+                                                       self._estimate_chunk_bytes(csv_path))
+                    staging_path, checkpoint = self._prepare_staging_folder(file_cache_path, expected)
+                    future = executor.submit(_convert_csv_file_worker, csv_path, staging_path, checkpoint,
+                                             self.cache_dir, settings)
+                    file_tasks.append((future, None))
+                    continue
+
+                # Zakresy są deterministyczne dla danego pliku i range_bytes, więc po
+                # przerwaniu wystarczy pominąć te, które mają znacznik _part_i.done
+                expected = self._checkpoint_header(fingerprint, config_key, "ranges", range_bytes)
+                staging_path, _ = self._prepare_staging_folder(file_cache_path, expected)
+                header, ranges = _split_csv_byte_ranges(csv_path, range_bytes)
+                futures = []
+                for i, (start, end) in enumerate(ranges):
+                    if os.path.exists(os.path.join(staging_path, f"_part_{i}.done")):
+                        futures.append(None)
+                        continue
+                    futures.append(executor.submit(_convert_csv_range_worker, csv_path, header, start, end,
+                                                   staging_path, i, self.cache_dir, settings))
+                file_tasks.append((None, (staging_path, futures)))
+
+            for idx, ((csv_path, file_cache_path, fingerprint), (future, range_futures)) in enumerate(
+                    zip(jobs, file_tasks)):
+                file_name = os.path.basename(csv_path)
+                self.log(f"Plik {idx + 1}/{len(jobs)}: {file_name}", "success")
+                try:
+                    if future is not None:
+                        records, total_rows, stats = future.result()
+                        self.stats.records.extend(stats)
+                        for message, level in records:
+                            self.log(message, level)
+                        if total_rows is not None:
+                            self._commit_cache_folder(manifest, csv_path, file_cache_path, fingerprint,
+                                                      config_key, total_rows)
+                        continue
+
+                    staging_path, range_futures = range_futures
+                    self.log(f"  ∟ Podział na {len(range_futures)} zakresów bajtów", "info")
+                    done_parts = sum(1 for f in range_futures if f is None)
+                    if done_parts:
+                        self.log(f"  ∟ Wznowienie: {done_parts}/{len(range_futures)} zakresów już gotowych", "info")
+                    results = [f.result() for f in range_futures if f is not None]
+                except Exception as e:
+                    self.log(f"Błąd krytyczny pliku {file_name}: {str(e)}", "error")
+                    continue
+
+                # Pełny raport z pierwszego przeliczonego zakresu, z pozostałych tylko ostrzeżenia i błędy
+                for part_idx, (records, _, _, _, stats) in enumerate(results):
+                    self.stats.records.extend(stats)
+                    for message, level in records:
+                        if part_idx == 0 or level in ("warning", "error"):
+                            self.log(message, level)
+
+                total_rows = sum(
+                    self._read_done_marker(staging_path, i) for i, f in enumerate(range_futures) if f is None
+                ) + sum(r[1] for r in results)
+                elapsed = (max(r[3] for r in results) - min(r[2] for r in results)) if results else 0.0
+                self.log(f"   ∟ Sukces: {total_rows} rekordów w {elapsed:.2f}s", "info")
+                self._commit_cache_folder(manifest, csv_path, file_cache_path, fingerprint, config_key,
+                                          total_rows)
+
+    def get_unique_items(self):
+        """Wyciąga unikalne wartości używając poprawnych nazw kolumn z Parquet"""
+        all_files = self._cache_part_files()
         if not all_files:
             return {}
 
@@ -353,6 +1958,8 @@ class AnalysisCalculator:
             mapping = {
                 'Nazwa oprawy': 'Ldc name',
                 'Rozmieszczenie': 'Arrangement',
+                'Typ drogi': 'Road type',
+                'Liczba pasów': 'Lanes',
                 'Szerekość drogi [m]': 'Road W[m]',
                 'Odstęp między oprawami [m]': 'Delta [m]',
                 'Wysokość montażu [m]': 'Lph [m]',
@@ -362,36 +1969,35 @@ class AnalysisCalculator:
 
             cols_to_extract = {nice_name: set() for nice_name in mapping.keys()}
 
-            for file in all_files:
+            def _file_values(file):
                 # Sprawdzamy jakie kolumny są w tym konkretnym pliku
-                actual_columns = None
-                if pq is not None:
-                    try:
-                        actual_columns = pq.ParquetFile(file).schema.names
-                    except Exception:
-                        actual_columns = None
+                schema = self._file_schema(file)
+                actual_columns = schema.names if schema is not None else None
                 if actual_columns is None:
                     try:
                         actual_columns = pd.read_parquet(file).columns
                     except Exception:
-                        continue
+                        return {}
 
                 # Budujemy listę kolumn do wczytania, które faktycznie istnieją
                 to_read = [phys for nice, phys in mapping.items() if phys in actual_columns]
+                if not to_read:
+                    return {}
 
-                if to_read:
-                    if pq is not None:
-                        try:
-                            temp_df = pq.read_table(file, columns=to_read).to_pandas()
-                        except Exception:
-                            temp_df = pd.read_parquet(file, columns=to_read)
-                    else:
+                if pq is not None:
+                    try:
+                        temp_df = pq.read_table(file, columns=to_read).to_pandas()
+                    except Exception:
                         temp_df = pd.read_parquet(file, columns=to_read)
+                else:
+                    temp_df = pd.read_parquet(file, columns=to_read)
+                return {nice_name: temp_df[phys_name].dropna().unique()
+                        for nice_name, phys_name in mapping.items() if phys_name in temp_df.columns}
 
-                    # Przepisujemy dane do zestawów unikalnych wartości
-                    for nice_name, phys_name in mapping.items():
-                        if phys_name in temp_df.columns:
-                            cols_to_extract[nice_name].update(temp_df[phys_name].dropna().unique())
+            # Przepisujemy dane do zestawów unikalnych wartości (pliki czytane równolegle)
+            for values in self._map_parts(_file_values, all_files):
+                for nice_name, unique_values in values.items():
+                    cols_to_extract[nice_name].update(unique_values)
 
             # Budowanie finalnego słownika dla GUI
             final_menu_data = {}
@@ -413,53 +2019,140 @@ class AnalysisCalculator:
             return {}
 
     def get_unique_luminaires(self):
-        """Skanuje pliki CSV w poszukiwaniu unikalnych opraw dla tabeli MF"""
+        """Zwraca unikalne oprawy ("Ldc name | Lamp info") dla tabeli MF.
+
+        Korzysta z trwałego katalogu opraw - CSV skanujemy tylko wtedy, gdy pliku
+        nie ma w katalogu albo zmienił się jego odcisk zawartości.
+        """
         if not self.csv_files:
             self.log("Błąd skanowania: Brak wybranych plików CSV.", "error")
             return []
 
-        self.log(f"Rozpoczynam głębokie skanowanie {len(self.csv_files)} plików w poszukiwaniu opraw...", "info")
-        lums = set()
-
-        import time
         start_time = time.time()
+        catalog = self._load_luminaire_catalog()
+
+        fingerprints = {f: self._file_fingerprint(f) for f in self.csv_files}
+        to_scan = [f for f in self.csv_files
+                   if catalog["files"].get(f, {}).get("fingerprint") != fingerprints[f]]
+
+        if to_scan:
+            self.log(f"Skanowanie {len(to_scan)} nowych/zmienionych plików w poszukiwaniu opraw...", "info")
+            # Czytanie dwóch kolumn jest ograniczone przez I/O - skanujemy pliki równolegle w wątkach
+            with ThreadPoolExecutor(max_workers=min(len(to_scan), os.cpu_count() or 1)) as executor:
+                futures = {f: executor.submit(self._scan_luminaires, f) for f in to_scan}
+                for f, future in futures.items():
+                    try:
+                        self._register_luminaire_counts(catalog, f, fingerprints[f], future.result())
+                    except Exception as e:
+                        self.log(f"Pominięto plik {os.path.basename(f)} przy skanowaniu: {e}", "warning")
+            self._save_luminaire_catalog(catalog)
 
+        by_id = {str(lum["id"]): lum for lum in catalog["luminaires"]}
+        lums = set()
         for f in self.csv_files:
-            f_name = os.path.basename(f)
-            try:
-                # Wczytujemy TYLKO niezbędne kolumny – to oszczędza mnóstwo czasu i RAMu
-                temp_df = pd.read_csv(f, sep=';', usecols=['Ldc name', 'Lamp info'], encoding='cp1252')
-
-                # Tworzymy klucz (taki sam jak później w apply_custom_mf!)
-                # Używamy separatora " | " dla czytelności w tabeli GUI
-                temp_df['key'] = temp_df['Ldc name'].astype(str) + " | " + temp_df['Lamp info'].astype(str)
-
-                # Update zbioru unikalnymi wartościami
-                new_lums = temp_df['key'].dropna().unique()
-                lums.update(new_lums)
+            for lum_id in catalog["files"].get(f, {}).get("counts", {}):
+                lums.add(self._luminaire_key(by_id[lum_id]["Ldc name"], by_id[lum_id]["Lamp info"]))
 
-                # Subtelny log postępu dla każdego pliku
-                # self.log(f"  ∟ {f_name}: znaleziono {len(new_lums)} modeli", "info")
-
-            except Exception as e:
-                self.log(f"Pominięto plik {f_name} przy skanowaniu: {e}", "warning")
-                continue
-
-        sorted_lums = sorted(list(lums))
+        sorted_lums = sorted(lums)
         duration = time.time() - start_time
 
         self.log(
-            f"Skanowanie zakończone w {duration:.2f}s. Znaleziono łącznie {len(sorted_lums)} unikalnych konfiguracji opraw.",
+            f"Skanowanie zakończone w {duration:.2f}s ({len(self.csv_files) - len(to_scan)} plików z katalogu). "
+            f"Znaleziono łącznie {len(sorted_lums)} unikalnych konfiguracji opraw.",
             "success")
 
         return sorted_lums
 
+    def _luminaire_key(self, ldc_name, lamp_info):
+        """Klucz oprawy używany w tabeli MF w GUI"""
+        return f"{ldc_name} | {lamp_info}"
+
+    def _luminaire_by_id(self):
+        """Oprawy z katalogu według id (zapamiętane do zmiany pliku katalogu)"""
+        try:
+            stamp = os.path.getmtime(self._luminaire_catalog_file)
+        except OSError:
+            stamp = None
+        if stamp is None or self._luminaire_cache[0] != stamp:
+            luminaires = self._load_luminaire_catalog()["luminaires"]
+            self._luminaire_cache = (stamp, {lum["id"]: lum for lum in luminaires})
+        return self._luminaire_cache[1]
+
+    def _luminaire_index(self):
+        """Klucz tekstowy oprawy -> id z katalogu (klucze z GUI i dawne klucze ze spacją)"""
+        index = {}
+        for lum_id, lum in self._luminaire_by_id().items():
+            index[f"{lum['Ldc name']} {lum['Lamp info']}"] = lum_id
+            index[self._luminaire_key(lum["Ldc name"], lum["Lamp info"])] = lum_id
+        return index
+
+    def _load_luminaire_catalog(self):
+        try:
+            with open(self._luminaire_catalog_file, "r", encoding="utf-8") as fh:
+                catalog = json.load(fh)
+            if catalog.get("version") == 1:
+                return catalog
+        except Exception:
+            pass
+        return {"version": 1, "luminaires": [], "files": {}}
+
+    def _save_luminaire_catalog(self, catalog):
+        """Zapisuje katalog opraw atomowo (plik tymczasowy + os.replace)"""
+        tmp_file = self._luminaire_catalog_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as fh:
+            json.dump(catalog, fh, ensure_ascii=False)
+        os.replace(tmp_file, self._luminaire_catalog_file)
+
+    def _register_luminaire_counts(self, catalog, csv_path, fingerprint, counts):
+        """Dopisuje liczności opraw pliku do katalogu. Nowe oprawy dostają kolejne id."""
+        ids = {(lum["Ldc name"], lum["Lamp info"]): lum["id"] for lum in catalog["luminaires"]}
+        file_counts = {}
+        for (ldc_name, lamp_info), n in counts.items():
+            pair = (ldc_name, lamp_info)
+            if pair not in ids:
+                ids[pair] = len(catalog["luminaires"])
+                catalog["luminaires"].append({"id": ids[pair], "Ldc name": ldc_name, "Lamp info": lamp_info})
+            file_counts[str(ids[pair])] = file_counts.get(str(ids[pair]), 0) + int(n)
+        catalog["files"][csv_path] = {"fingerprint": fingerprint, "counts": file_counts}
+
+    def _count_luminaire_pairs(self, df):
+        """Liczy wiersze dla każdej pary (Ldc name, Lamp info)"""
+        sizes = df.groupby(['Ldc name', 'Lamp info'], observed=True, dropna=False).size()
+        return {(str(ldc_name), str(lamp_info)): int(n) for (ldc_name, lamp_info), n in sizes.items() if n}
+
+    def _scan_luminaires(self, csv_path):
+        """Szybki skan dwóch kolumn CSV (wielowątkowy czytnik Arrow, pandas jako zapas)"""
+        columns = ['Ldc name', 'Lamp info']
+        if pa_csv is not None:
+            read_options = pa_csv.ReadOptions(encoding='cp1252', use_threads=True, block_size=16 * 1024 * 1024)
+            convert_options = pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={c: pa.dictionary(pa.int32(), pa.string()) for c in columns})
+            table = pa_csv.read_csv(csv_path, read_options=read_options,
+                                    parse_options=pa_csv.ParseOptions(delimiter=';'),
+                                    convert_options=convert_options)
+            df = table.to_pandas()
+        else:
+            df = pd.read_csv(csv_path, sep=';', usecols=columns, encoding='cp1252')
+        return self._count_luminaire_pairs(df)
+
+    def _count_luminaires_in_cache(self, file_cache_path):
+        """Liczy oprawy w gotowych part_i.parquet (dwie słownikowane kolumny - odczyt jest tani)"""
+        counts = {}
+        for part in glob.glob(os.path.join(file_cache_path, "**", "part_*.parquet"), recursive=True):
+            df = pd.read_parquet(part, columns=['Ldc name', 'Lamp info'])
+            for pair, n in self._count_luminaire_pairs(df).items():
+                counts[pair] = counts.get(pair, 0) + n
+        return counts
+
     def get_sample_data(self, n_rows=100):
         """Pobiera próbkę danych i loguje to do Twojej konsoli GUI"""
         import glob
         import os
 
-        folders = [f for f in glob.glob(os.path.join(self.cache_dir, "*")) if os.path.isdir(f)]
+        # Foldery pomocnicze cache (_result_spill, _duckdb_tmp) zaczynają się od "_" - to nie dane
+        folders = [f for f in glob.glob(os.path.join(self.cache_dir, "*"))
+                   if os.path.isdir(f) and not os.path.basename(f).startswith("_")]
 
         if not folders:
             # ZAMIAST print() -> używamy self.log()
@@ -467,8 +2160,11 @@ class AnalysisCalculator:
             return None
 
         try:
-            df = pd.read_parquet(folders[0])
-            sample = df.head(n_rows)
+            # Czytamy pliki części zamiast całego folderu - w układzie hive kolumny
+            # partycji są zarówno w ścieżce, jak i w plikach
+            parts = sorted(glob.glob(os.path.join(folders[0], "**", "part_*.parquet"), recursive=True))
+            df = pd.read_parquet(parts[0])
+            sample = self._add_norm_columns(self._apply_active_config(df.head(n_rows).copy()), NORM_COLUMNS)
 
             # TUTAJ BYŁ PROBLEM: Zmieniamy print na self.log
             self.log(f"Wyświetlono {len(sample)} wierszy w tabeli podglądu.", "success")
@@ -480,221 +2176,681 @@ class AnalysisCalculator:
 
     def get_all_data(self):
         """Ładuje całą bazę cache do analiz statystycznych"""
-        import glob
-        all_files = glob.glob(os.path.join(self.cache_dir, "**", "*.parquet"), recursive=True)
+        all_files = self._cache_part_files()
         if not all_files:
             return pd.DataFrame()
-        return pd.concat([pd.read_parquet(f) for f in all_files], ignore_index=True)
+        df = pd.concat([pd.read_parquet(f) for f in all_files], ignore_index=True)
+        return self._add_norm_columns(self._apply_active_config(df), NORM_COLUMNS)
 
     def _filters_cache_key(self, filters):
-        return tuple(sorted((k, str(v)) for k, v in (filters or {}).items()))
+        return tuple(sorted((k, str(v)) for k, v in (filters or {}).items())), self._active_config_key()
 
-    def get_filtered_data(self, filters):
-        """Pobiera i łączy dane z cache, stosując filtry z GUI"""
-        import glob
-        import os
-        import pandas as pd
-        try:
-            import pyarrow.parquet as pq
-        except Exception:
-            pq = None
+    def sql(self, query, params=None):
+        """Wykonuje zapytanie SQL (DuckDB) na widoku "results" z całego cache i zwraca DataFrame.
 
-        cache_key = self._filters_cache_key(filters)
-        if cache_key in self._filters_cache:
-            return self._filters_cache[cache_key].copy()
+        Widok obejmuje wszystkie pliki części, aktywną konfigurację (MF i czas
+        świecenia, jak _apply_active_config) oraz wirtualne kolumny procentowe
+        norm ('Lav(M3)' itd.). DuckDB liczy zapytanie wielowątkowo i strumieniowo,
+        w razie potrzeby z wymianą na dysk - do Pythona trafia tylko wynik, np.:
 
-        all_files = glob.glob(os.path.join(self.cache_dir, "**", "*.parquet"), recursive=True)
+            engine.sql('SELECT Arrangement, best_class, count(*) AS n, avg(De) AS De '
+                       'FROM results GROUP BY ALL ORDER BY ALL')
+
+        Bez pakietu duckdb albo przy błędzie zapytania loguje błąd i zwraca pusty DataFrame.
+        """
+        if duckdb is None:
+            self.log("Brak pakietu duckdb - tryb SQL jest niedostępny (pip install duckdb).", "error")
+            return pd.DataFrame()
+        all_files = self._cache_part_files()
+        if not all_files:
+            self.log("Brak danych w cache - najpierw przeprowadź mielenie.", "warning")
+            return pd.DataFrame()
+        try:
+            with self._sql_lock:
+                return self._sql_view(sorted(all_files)).execute(query, params or []).df()
+        except Exception as e:
+            self.log(f"❌ Błąd zapytania SQL: {e}", "error")
+            return pd.DataFrame()
 
-        # 1. Nie filtrujemy po nazwie folderu - Arrangement jest kolumną w danych
-        filtered_files = all_files
+    def _sql_view(self, all_files):
+        """Połączenie DuckDB z aktualnym widokiem - odtwarzanym po zmianie plików cache lub konfiguracji"""
+        if self._sql_connection is None:
+            con = duckdb.connect(database=":memory:")
+            # Wyniki pośrednie większe niż pamięć trafiają na dysk obok cache
+            con.execute(f"SET temp_directory = {_sql_literal(os.path.join(self.cache_dir, '_duckdb_tmp'))}")
+            if self.memory_budget_mb:
+                con.execute(f"SET memory_limit = '{int(self.memory_budget_mb)}MB'")
+            if self.sql_threads:
+                con.execute(f"SET threads = {int(self.sql_threads)}")
+            self._sql_connection = con
+
+        stamps = []
+        for f in all_files:
+            stat = os.stat(f)
+            stamps.append((f, stat.st_mtime_ns, stat.st_size))
+        signature = (tuple(stamps), self._active_config_key())
+        if signature != self._sql_signature:
+            self._sql_connection.execute(self._sql_view_definition(all_files))
+            self._sql_signature = signature
+        return self._sql_connection
+
+    def _sql_view_definition(self, all_files):
+        """CREATE VIEW dla widoku SQL - te same wzory i typy co odczyt przez pandas.
+
+        Kolumny bazowe czytamy z plików części (katalogi hive nie dodają
+        kolumn - wartości partycji są też w plikach). Każdy wynik pośredni
+        rzutujemy na FLOAT, jak float32 w _apply_active_config
+        i _add_norm_columns, a zaokrąglamy jak np.round (round_even na
+        iloczynie w float32), więc wartości są identyczne z get_all_data.
+        MF różne od 0.8 bierzemy z wyrażenia CASE po 'Ldc name' i 'Lamp info'
+        (bez złączenia, więc kolejność wierszy zostaje), przeliczamy best_class
+        i De, a na końcu dokładamy wirtualne kolumny procentowe.
+        """
+        # Kolumny ze wszystkich plików, w kolejności pierwszego wystąpienia
+        stored = []
+        for f in all_files:
+            schema = self._file_schema(f)
+            for name in (schema.names if schema is not None else []):
+                if name not in stored:
+                    stored.append(name)
+        q = _sql_ident
+        files_sql = ", ".join(_sql_literal(f) for f in all_files)
+        source = f"read_parquet([{files_sql}], union_by_name = true, hive_partitioning = false)"
+
+        def f32(expr):
+            return f"CAST({expr} AS FLOAT)"
+
+        def number(value):
+            # Literał przez napis - DuckDB nie robi z niego DECIMAL, a DOUBLE jest dokładnie jak w Pythonie
+            return f"CAST('{float(value)!r}' AS DOUBLE)"
+
+        def round_f32(expr, decimals):
+            # np.round w float32: iloczyn przez 10^n w float32, zaokrąglenie do parzystej i dzielenie w float32
+            scale = f32(number(10 ** decimals))
+            rounded = f32("round_even(" + f32(f"{expr} * {scale}") + ", 0)")
+            return f32(f"{rounded} / {scale}")
+
+        expressions = {name: f"b.{q(name)}" for name in stored}
+        by_id = self._luminaire_by_id()
+        mf_rows = [(by_id[i]["Ldc name"], by_id[i]["Lamp info"], mf / REFERENCE_MF)
+                   for i, mf in self.active_mf.items() if i in by_id]
+        mf_active = bool(mf_rows) and {'Ldc name', 'Lamp info'} <= set(stored)
+        if mf_active:
+            cases = " ".join(f"WHEN b.{q('Ldc name')} = {_sql_literal(n)} AND b.{q('Lamp info')} = {_sql_literal(l)}"
+                             f" THEN {number(factor)}" for n, l, factor in mf_rows)
+            factor = f"CASE {cases} ELSE {number(1.0)} END"
+            for col in MF_COLUMNS:
+                if col in expressions:
+                    # Iloczyn w float64 i powrót do float32 - jak apply_custom_mf
+                    expressions[col] = f32(f"b.{q(col)} * {factor}")
+        if (self.active_burning_hours != REFERENCE_BURNING_HOURS
+                and {'De', 'Total power [W]', 'A [m2]'} <= set(stored)):
+            energy = f32(f"b.{q('Total power [W]')} * {f32(number(self.active_burning_hours))}")
+            area = f32(f"b.{q('A [m2]')} * {f32(number(1000))}")
+            expressions['De'] = round_f32(f32(f"{energy} / {area}"), 4)
+
+        def measured(param):
+            # Pomiar po korekcie MF (wyrażenie z poziomu pojedynczego wiersza)
+            return f"({expressions[NORM_PARAMS[param]]})"
+
+        has_params = all(c in expressions for c in NORM_PARAMS.values())
+        if mf_active and 'best_class' in expressions and has_params:
+            cases = []
+            for class_name, req in NORMS.items():
+                conds = [f"{measured(p)} {'<=' if p == 'TI' else '>='} {f32(number(req[p]))}"
+                         for p in NORM_PARAMS]
+                cases.append(f"WHEN {' AND '.join(conds)} THEN {_sql_literal(class_name)}")
+            expressions['best_class'] = f"CASE {' '.join(cases)} ELSE 'Brak' END"
+
+        # Kolumny procentowe trafiają przed 'best_class', jak w get_all_data
+        columns = [f"{expr} AS {q(name)}" for name, expr in expressions.items()]
+        loc = stored.index('best_class') if 'best_class' in stored else len(columns)
+        for name in self._virtual_norm_columns(stored):
+            param, class_name = NORM_COLUMNS[name]
+            req = f32(number(NORMS[class_name][param]))
+            if param == 'TI':
+                divisor = f"CASE WHEN {measured(param)} = 0 THEN {f32(number(0.1))} ELSE {measured(param)} END"
+                ratio = f32(f"{req} / {divisor}")
+            else:
+                ratio = f32(f"{measured(param)} / {req}")
+            percent = f32(f"{ratio} * {f32(number(100))}")
+            columns.insert(loc, f"{round_f32(percent, 1)} AS {q(name)}")
+            loc += 1
+
+        return (f"CREATE OR REPLACE VIEW {q(self.sql_view_name)} AS SELECT {', '.join(columns)} "
+                f"FROM {source} AS b")
+
+    def _cache_part_files(self):
+        """Wszystkie pliki części w cache (foldery robocze z kropką są pomijane przez glob,
+        a kostki _cube.parquet nie pasują do wzorca part_*)"""
+        return glob.glob(os.path.join(self.cache_dir, "**", "part_*.parquet"), recursive=True)
+
+    def _file_schema(self, file):
+        """Schemat Arrow pliku części - czytany ze stopki raz i zapamiętywany do zmiany pliku"""
+        if pq is None:
+            return None
+        try:
+            stat = os.stat(file)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            cached = self._schema_cache.get(file)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            schema = pq.read_schema(file)
+            self._schema_cache[file] = (stamp, schema)
+            return schema
+        except Exception:
+            return None
 
-        final_dfs = []
-        for file in filtered_files:
-            try:
-                # Czytamy tylko potrzebne kolumny (oszczędność RAM)
-                base_cols = {
-                    'Arrangement', 'Road W[m]', 'De', 'Dp', 'Ldc name',
-                    'Total flux [lm]', 'best_class', 'Delta [m]', 'Lph [m]', 'Tilt [°]'
-                }
-                schema_cols = None
-                if pq is not None:
-                    try:
-                        schema_cols = pq.ParquetFile(file).schema.names
-                    except Exception:
-                        schema_cols = None
+    def _map_parts(self, fn, files):
+        """Wykonuje fn(plik) dla każdego pliku w puli self.query_workers wątków.
 
-                selected_class = filters.get('Klasa oświetleniowa', "Wszystkie")
-                if schema_cols:
-                    if selected_class != "Wszystkie":
-                        lav_cols = [f"Lav({selected_class})"]
-                        lav_cols = [c for c in lav_cols if c in schema_cols]
+        Czytanie i dekompresja Parquet w Arrow zwalniają GIL, więc wątki
+        skalują się z liczbą rdzeni. executor.map zwraca wyniki w kolejności
+        plików - scalanie częściowych wyników jest deterministyczne.
+        """
+        workers = min(self.query_workers, len(files))
+        if workers <= 1:
+            return [fn(file) for file in files]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fn, files))
+
+    def _scan_cache(self, filters, columns_for, reducer, row_positions=False):
+        """Wspólny silnik skanowania cache dla zapytań z GUI.
+
+        1. odrzuca katalogi partycji niepasujące do filtrów,
+        2. dla każdego pliku bierze schemat z pamięci podręcznej i wybiera
+           kolumny przez columns_for(nazwy_kolumn_w_pliku),
+        3. czyta je z predicate pushdown według skompilowanego planu filtrów
+           (wirtualne kolumny procentowe są widoczne w nazwach i liczone po odczycie
+           z pomiarów bazowych),
+        4. redukuje wynik funkcją reducer(df) - np. zbiera wiersze albo liczy
+           częściowe grupowanie.
+        Pliki są przetwarzane równolegle (_map_parts), a błędy logowane
+        w wątku wywołującym. Zwraca listę wyników reducera (bez None)
+        w kolejności plików. Z row_positions=True ramki mają dodatkowo kolumnę
+        '__row' (numer wiersza w pliku, zob. _read_part_rows), a lista zawiera
+        pary (plik, wynik reducera).
+        """
+        # Z aktywnymi MF best_class w plikach jest nieaktualna - jej filtr stosujemy
+        # dopiero po przeliczeniu, a katalogów best_class=... nie odrzucamy
+        deferred = ('best_class',) if self.active_mf else ()
+        plan = _FilterPlan(filters, deferred)
+        prune_filters = dict(filters or {}, **{'Klasa oświetleniowa': "Wszystkie"}) if deferred else filters
+        files = self._prune_partitioned_files(self._cache_part_files(), prune_filters)
+
+        def scan_file(file):
+            try:
+                schema = self._file_schema(file)
+                if schema is not None:
+                    wanted, derived, cols_to_read = self._scan_columns(schema, columns_for, deferred)
+                    # Filtry idą do czytnika Parquet - pomija on grupy wierszy po statystykach
+                    if row_positions:
+                        table = self._read_part_rows(file, cols_to_read, plan.expression(schema),
+                                                     plan.columns(schema))
                     else:
-                        lav_cols = [c for c in schema_cols if 'Lav' in c]
-                    cols_to_read = list(base_cols.union(lav_cols))
-                    df = pd.read_parquet(file, columns=cols_to_read)
+                        table = pq.read_table(file, columns=cols_to_read, filters=plan.expression(schema))
+                    df = table.to_pandas()
+                    df = self._apply_active_config(df)
+                    if deferred:
+                        df = plan.apply(df, deferred_only=True)
+                    if derived:
+                        df = self._add_norm_columns(df, derived)
+                    df = df.drop(columns=[c for c in df.columns if c not in wanted and c != '__row'])
                 else:
-                    df = pd.read_parquet(file)
-
-                # Downcast liczbowych kolumn, żeby ograniczyć zużycie pamięci
-                for col in df.select_dtypes(include=['float64']).columns:
-                    df[col] = pd.to_numeric(df[col], downcast='float')
-                for col in df.select_dtypes(include=['int64']).columns:
-                    df[col] = pd.to_numeric(df[col], downcast='integer')
-
-                # --- FILTROWANIE KOLUMN ---
-
-                # Układ (Arrangement)
-                selected_arrangement = filters.get('Rozmieszczenie', "Wszystkie")
-                if selected_arrangement != "Wszystkie":
-                    df['Arrangement'] = df['Arrangement'].astype(str).str.strip()
-                    df = df[df['Arrangement'] == selected_arrangement]
-
-                # Oprawa (Ldc name)
-                if filters.get('Nazwa oprawy') != "Wszystkie":
-                    df = df[df['Ldc name'] == filters.get('Nazwa oprawy')]
-
-                # Klasa oświetleniowa (mapujemy na 'best_class')
-                if filters.get('Klasa oświetleniowa') != "Wszystkie":
-                    df = df[df['best_class'] == filters.get('Klasa oświetleniowa')]
-
-                # Parametry numeryczne (Szerokość, Rozstaw, Wysokość)
-                # Używamy bezpiecznej konwersji, bo dane z Combobox to Stringi
-                num_filters = {
-                    'Szerekość drogi [m]': 'Road W[m]',
-                    'Odstęp między oprawami [m]': 'Delta [m]',
-                    'Wysokość montażu [m]': 'Lph [m]',
-                    'Nachylenie (°)': 'Tilt [°]'
-                }
-
-                for nice_name, col_name in num_filters.items():
-                    val = filters.get(nice_name)
-                    if val and val != "Wszystkie":
-                        try:
-                            df = df[df[col_name] == float(val)]
-                        except (ValueError, TypeError):
-                            continue
-
-                if not df.empty:
-                    final_dfs.append(df)
+                    df = plan.apply(self._apply_active_config(pd.read_parquet(file)))
+                    df = self._add_norm_columns(df, columns_for(list(df.columns) + list(NORM_COLUMNS)))
 
+                if df.empty:
+                    return None, None
+                return reducer(df), None
             except Exception as e:
-                self.log(f"Błąd filtrowania w pliku {file}: {e}", "error")
+                return None, e
+
+        partials = []
+        for file, (partial, error) in zip(files, self._map_parts(scan_file, files)):
+            if error is not None:
+                self.log(f"Błąd filtrowania w pliku {file}: {error}", "error")
+            elif partial is not None:
+                partials.append((file, partial) if row_positions else partial)
+        return partials
+
+    def _scan_columns(self, schema, columns_for, deferred=()):
+        """Dobór kolumn dla pliku o danym schemacie: (wanted, derived, cols_to_read).
+
+        wanted to kolumny wyniku (z wirtualnymi kolumnami procentowymi), derived -
+        te z nich liczone po odczycie, a cols_to_read - kolumny czytane z pliku,
+        razem z pomiarami bazowymi i kolumnami potrzebnymi aktywnej konfiguracji.
+        """
+        virtual = self._virtual_norm_columns(schema.names)
+        wanted = [c for c in columns_for(schema.names + virtual) if c in schema.names or c in virtual]
+        derived = [c for c in wanted if c in virtual]
+        bases = [NORM_PARAMS[NORM_COLUMNS[c][0]] for c in derived]
+        extra = self._active_config_columns(set(wanted) | set(deferred)) + list(deferred)
+        cols_to_read = list(dict.fromkeys(
+            [c for c in wanted if c in schema.names] + bases + [c for c in extra if c in schema.names]))
+        return wanted, derived, cols_to_read
+
+    def _read_part_rows(self, file, columns, expression, filter_columns):
+        """Jak pq.read_table(file, columns, filters=expression), ale z kolumną '__row' - numerem wiersza w pliku.
+
+        Grupy wierszy odrzucamy po statystykach (split_by_row_group), a filtr
+        nakładamy na przeczytane grupy, więc numery wierszy znamy bez czytania
+        całego pliku. Z nich powstaje selekcja wyniku (_row_selection).
+        """
+        parquet_file = pq.ParquetFile(file)
+        metadata = parquet_file.metadata
+        offsets = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        if expression is None:
+            row_groups = list(range(metadata.num_row_groups))
+        else:
+            fragment = next(iter(ds.dataset(file, format="parquet").get_fragments()))
+            row_groups = [piece.row_groups[0].id for piece in fragment.split_by_row_group(filter=expression)]
+        table = parquet_file.read_row_groups(row_groups, columns=list(dict.fromkeys(columns + filter_columns)))
+        rows = [np.arange(offsets[g], offsets[g + 1], dtype=np.int64) for g in row_groups]
+        table = table.append_column('__row', pa.array(np.concatenate(rows) if rows else np.empty(0, np.int64)))
+        if expression is not None:
+            table = table.filter(expression)
+        return table.select(columns + ['__row'])
+
+    def _lav_columns_for(self, filters):
+        """Dobór kolumn Lav(Mx): tylko wybrana klasa albo wszystkie kolumny z 'Lav'"""
+        selected_class = filters.get('Klasa oświetleniowa', "Wszystkie")
+
+        def lav_columns(schema_cols):
+            if selected_class != "Wszystkie":
+                return [c for c in [f"Lav({selected_class})"] if c in schema_cols]
+            return [c for c in schema_cols if 'Lav' in c]
+        return lav_columns
+
+    def _collect_rows(self, df):
+        """Reducer: zwraca przefiltrowane wiersze (z downcastem liczb, żeby ograniczyć RAM)"""
+        for col in df.select_dtypes(include=['float64']).columns:
+            df[col] = pd.to_numeric(df[col], downcast='float')
+        for col in df.select_dtypes(include=['int64']).columns:
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        return df
+
+    def _groupby_reducer(self, keys, value):
+        """Reducer: częściowe grupowanie (suma i liczność) wartości value(df) po kolumnach keys"""
+        def reduce(df):
+            values = value(df)
+            if values is None:
+                return None
+            grouped = values.groupby([df[k] for k in keys], observed=True).agg(['sum', 'count'])
+            return grouped.rename(columns={'sum': 'val_sum', 'count': 'val_count'}).reset_index()
+        return reduce
 
-        if not final_dfs:
+    def get_filtered_data(self, filters):
+        """Pobiera i łączy dane z cache, stosując filtry z GUI.
+
+        Wynik trafia do pamięci podręcznej wyników (_ResultCache) razem z selekcją
+        wierszy, a wywołujący dostaje widok tylko do odczytu (_read_only_view) -
+        kolejne kliknięcia wykresów z tymi samymi filtrami nie kopiują danych.
+        Zawężenie filtrów względem wyniku w pamięci jest filtrowane w pamięci
+        (_refine_cached_result) zamiast skanowania plików.
+        """
+        cache_key = self._filters_cache_key(filters)
+        cached = self._cached_result(cache_key)
+        if cached is None:
+            cached = self._refine_cached_result(filters, cache_key)
+        if cached is not None and cached.empty:
             self.log("Brak danych spełniających wybrane kryteria.", "warning")
             return pd.DataFrame()
+        if cached is not None:
+            return _read_only_view(cached)
 
-        result = pd.concat(final_dfs, ignore_index=True)
-        self._filters_cache[cache_key] = result
-        self._filters_cache_order.append(cache_key)
-        if len(self._filters_cache_order) > self._filters_cache_limit:
-            old_key = self._filters_cache_order.pop(0)
-            self._filters_cache.pop(old_key, None)
-        return result.copy()
+        parts = self._scan_cache(filters, self._filtered_columns_for(filters), self._collect_rows,
+                                 row_positions=True)
 
-    def get_arrangement_comparison_data(self, filters, mode='efficiency'):
-        """Agreguje dane do wykresów 1-3 bez ładowania całej bazy."""
-        import glob
-        import pandas as pd
+        if not parts:
+            self.log("Brak danych spełniających wybrane kryteria.", "warning")
+            return pd.DataFrame()
+
+        selection = self._row_selection(parts)
+        result = pd.concat([df.drop(columns=['__row'], errors='ignore') for _, df in parts], ignore_index=True)
+        if selection is not None:
+            selection["columns"] = list(result.columns)
+        self._result_cache().put(cache_key, result, selection)
+        return _read_only_view(result)
+
+    def _filtered_columns_for(self, filters):
+        """Dobór kolumn get_filtered_data: stałe kolumny wykresów i kolumny Lav"""
+        # Czytamy tylko potrzebne kolumny (oszczędność RAM)
+        base_cols = {
+            'Arrangement', 'Road W[m]', 'De', 'Dp', 'Ldc name',
+            'Total flux [lm]', 'best_class', 'Delta [m]', 'Lph [m]', 'Tilt [°]'
+        }
+        lav_columns = self._lav_columns_for(filters)
+        return lambda cols: base_cols.union(lav_columns(cols))
+
+    def _refine_cached_result(self, filters, cache_key):
+        """Wynik dla filters wyliczony z wyniku w pamięci, którego filtry są luźniejsze.
+
+        Gdy użytkownik zawęża wybór (np. "Naprzeciwlegly" -> "Naprzeciwlegly + M3
+        + 7.5 m"), wcześniejszy wynik z tą samą konfiguracją zawiera już wszystkie
+        potrzebne wiersze i kolumny - wystarczy maska na dodatkowych warunkach.
+        Kolejność wierszy jest taka sama jak przy skanowaniu plików. Spośród
+        pasujących wyników bierzemy najmniejszy; nowy wynik trafia do cache
+        z selekcją zawężoną tą samą maską (pustego nie zapamiętujemy). None, gdy nic nie pasuje.
+        """
+        plan = _FilterPlan(filters)
+        wanted = plan.clauses()
+        best = None
+        for key, frame, selection in self._result_cache().frames():
+            if key[1] != cache_key[1]:
+                continue
+            cached_clauses = _FilterPlan(dict(key[0])).clauses()
+            if not cached_clauses <= wanted:
+                continue
+            extra = wanted - cached_clauses
+            if any(col not in frame.columns for col, _ in extra):
+                continue
+            if best is None or len(frame) < len(best[0]):
+                best = (frame, selection, extra)
+        if best is None:
+            return None
+
+        frame, selection, extra = best
+        keep = plan.mask(frame, extra)
+        columns = self._filtered_columns_for(filters)(list(frame.columns))
+        result = frame.loc[keep, [c for c in frame.columns if c in columns]].reset_index(drop=True)
+        if result.empty:
+            return result
+        if selection is not None:
+            selection = self._refine_selection(selection, keep, list(result.columns))
+        self._result_cache().put(cache_key, result, selection)
+        return result
+
+    def _refine_selection(self, selection, keep, columns):
+        """Selekcja podzbioru wyniku: keep to maska wierszy wyniku opisanego przez selection"""
+        files = []
+        offset = 0
+        for file, stamp, row_groups, bitmap in selection["files"]:
+            bits = np.unpackbits(bitmap).astype(bool)
+            positions = np.flatnonzero(bits)
+            file_keep = keep[offset:offset + len(positions)]
+            offset += len(positions)
+            if not file_keep.any():
+                continue
+            bits[:] = False
+            bits[positions[file_keep]] = True
+            files.append((file, stamp, row_groups, np.packbits(bits)))
+        return {"files": files, "columns": columns}
+
+    def _result_cache(self):
+        """Pamięć podręczna wyników zapytań - tworzona z budżetów przy pierwszym użyciu"""
+        if self._results is None:
+            if self.result_cache_mb:
+                max_bytes = int(self.result_cache_mb * 1024 * 1024)
+            else:
+                budget = self._memory_budget_bytes()
+                max_bytes = budget // 4 if budget else 512 * 1024 * 1024
+            self._results = _ResultCache(max_bytes, os.path.join(self.cache_dir, "_result_spill"),
+                                         int((self.result_spill_mb or 0) * 1024 * 1024))
+        return self._results
+
+    def _clear_results(self):
+        """Czyści wyniki zapytań (z plikami na dysku); budżety zostaną odczytane na nowo"""
+        if self._results is not None:
+            self._results.clear()
+            self._results = None
+
+    def _cached_result(self, cache_key):
+        """Wynik z pamięci podręcznej jako DataFrame - zamienniki (plik na dysku, selekcja)
+        są odtwarzane i wracają do pamięci. None, gdy wyniku nie ma albo jest nieaktualny."""
+        results = self._result_cache()
+        entry = results.get(cache_key)
+        if entry is None:
+            return None
+        if entry["kind"] == "frame":
+            return entry["value"]
         try:
-            import pyarrow.parquet as pq
-        except Exception:
-            pq = None
+            if entry["kind"] == "spill":
+                result = pd.read_parquet(entry["value"])
+            else:
+                result = self._materialize_selection(entry["value"])
+        except Exception as e:
+            self.log(f"Nie udało się odtworzyć wyniku z pamięci podręcznej: {e}", "warning")
+            return None
+        if result is None:
+            return None
+        results.put(cache_key, result, entry["selection"])
+        return result
 
-        all_files = glob.glob(os.path.join(self.cache_dir, "**", "*.parquet"), recursive=True)
-        if not all_files:
-            return pd.DataFrame()
+    def _row_selection(self, parts):
+        """Zwarta selekcja wyniku: dla każdego pliku (plik, (mtime, rozmiar), grupy wierszy, mapa bitowa).
 
-        base_cols = {'Arrangement', 'Road W[m]', 'Ldc name', 'best_class', 'Delta [m]', 'Lph [m]', 'Tilt [°]'}
-        if mode in ('De', 'Dp'):
-            base_cols.add(mode)
-        base_cols.add('Total flux [lm]')
+        Mapa bitowa (np.packbits) obejmuje wiersze wybranych grup wierszy po
+        kolei - odtworzenie to odczyt tych grup i filtr maską, bez wyrażeń
+        filtrów i aktywnej konfiguracji. Zwraca None, gdy pozycji wierszy nie
+        znamy (ścieżka bez pyarrow).
+        """
+        files = []
+        for file, df in parts:
+            if '__row' not in df.columns:
+                return None
+            rows = df['__row'].to_numpy().astype(np.int64)
+            metadata = pq.read_metadata(file)
+            sizes = np.array([metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)],
+                             dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(sizes)])
+            groups = np.searchsorted(offsets, rows, side='right') - 1
+            row_groups = np.unique(groups)
+            # Początek każdej wybranej grupy w sklejonym odczycie read_row_groups
+            starts = np.zeros(len(sizes), dtype=np.int64)
+            starts[row_groups] = np.cumsum(sizes[row_groups]) - sizes[row_groups]
+            mask = np.zeros(int(sizes[row_groups].sum()), dtype=bool)
+            mask[rows - offsets[groups] + starts[groups]] = True
+            stat = os.stat(file)
+            files.append((file, (stat.st_mtime_ns, stat.st_size), row_groups.tolist(), np.packbits(mask)))
+        return {"files": files, "columns": None}
+
+    def _materialize_selection(self, selection):
+        """Odtwarza wynik z selekcji wierszy; None, gdy któryś plik części się zmienił"""
+        columns = set(selection["columns"])
+
+        def read_file(item):
+            file, stamp, row_groups, bitmap = item
+            stat = os.stat(file)
+            if (stat.st_mtime_ns, stat.st_size) != stamp:
+                return None
+            wanted, derived, cols_to_read = self._scan_columns(self._file_schema(file), lambda cols: columns)
+            table = pq.ParquetFile(file).read_row_groups(row_groups, columns=cols_to_read)
+            mask = np.unpackbits(bitmap, count=table.num_rows).astype(bool)
+            df = self._apply_active_config(table.filter(pa.array(mask)).to_pandas())
+            if derived:
+                df = self._add_norm_columns(df, derived)
+            return self._collect_rows(df.drop(columns=[c for c in df.columns if c not in wanted]))
+
+        dfs = self._map_parts(read_file, selection["files"])
+        if any(df is None for df in dfs):
+            return None
+        return pd.concat(dfs, ignore_index=True)[selection["columns"]]
+
+    def _cube_path(self, folder_path):
+        return os.path.join(folder_path, "_cube.parquet")
+
+    def _cube_spec(self):
+        """Agregaty kostki: nazwa kolumny -> (kolumna źródłowa, funkcja)"""
+        spec = {'n': (self.cube_values[0], 'size')}
+        for v in self.cube_values:
+            spec[f"count({v})"] = (v, 'count')
+            spec[f"sum({v})"] = (v, 'sum')
+            spec[f"min({v})"] = (v, 'min')
+            spec[f"max({v})"] = (v, 'max')
+        for c in NORMS:
+            spec[f"pass({c})"] = (f"pass({c})", 'sum')
+        spec['pass_any'] = ('pass_any', 'sum')
+        return spec
+
+    def _chunk_cube(self, df):
+        """Częściowa kostka agregatów jednego kawałka danych.
+
+        Grupy po self.cube_keys; dla każdej: liczba wierszy 'n', dla wartości
+        z self.cube_values count/sum/min/max, a dla klas M1-M6 liczba wariantów
+        z Lav(Mx) >= 100 ('pass(Mx)') oraz 'pass_any' - jak w skanowaniu
+        (get_arrangement_comparison_data): dowolna kolumna z 'Lav' w nazwie >= 100.
+        """
+        lav_cols = [f"Lav({c})" for c in NORMS]
+        lav = self._add_norm_columns(df[[c for c in lav_cols + ['Lav [cd/m2]'] if c in df.columns]], lav_cols)
+        missing = [c for c in self.cube_keys + self.cube_values + lav_cols
+                   if c not in df.columns and c not in lav.columns]
+        if missing:
+            raise ValueError(f"brak kolumn {missing}")
+
+        passed = lav[lav_cols] >= 100
+        cube_df = df[self.cube_keys + self.cube_values].copy()
+        # Sumy liczymy w float64 - float32 traci precyzję na milionach wierszy
+        cube_df[self.cube_values] = cube_df[self.cube_values].astype('float64')
+        for c, col in zip(NORMS, lav_cols):
+            cube_df[f"pass({c})"] = passed[col].astype('int64')
+        any_lav = [c for c in lav.columns if 'Lav' in c]
+        cube_df['pass_any'] = (lav[any_lav].max(axis=1) >= 100).astype('int64')
+        return cube_df.groupby(self.cube_keys, observed=True, dropna=False,
+                               sort=False).agg(**self._cube_spec()).reset_index()
+
+    def _write_summary_cube(self, folder_path, part_ids=None):
+        """Scala częściowe kostki _cube_part_i w _cube.parquet folderu cache.
+
+        part_ids to numery ukończonych części; jeśli którejś częściowej kostki
+        brakuje (albo folder pochodzi sprzed kostek), liczymy ją od nowa
+        z plików part_*.parquet.
+        """
+        cube_parts = {os.path.basename(p)[len("_cube_part_"):-len(".parquet")]: p
+                      for p in glob.glob(os.path.join(folder_path, "_cube_part_*.parquet"))}
+        if part_ids and set(part_ids) <= set(cube_parts):
+            partials = self._map_parts(pd.read_parquet, [cube_parts[i] for i in sorted(part_ids, key=int)])
+        else:
+            parts = sorted(glob.glob(os.path.join(folder_path, "**", "part_*.parquet"), recursive=True))
+            wanted = self.cube_keys + self.cube_values + [f"Lav({c})" for c in NORMS] + ['Lav [cd/m2]']
+
+            def part_cube(part):
+                names = pq.read_schema(part).names if pq is not None else list(pd.read_parquet(part).columns)
+                return self._chunk_cube(pd.read_parquet(part, columns=[c for c in wanted if c in names]))
+            partials = self._map_parts(part_cube, parts)
+        if not partials:
+            return
 
-        selected_class = filters.get('Klasa oświetleniowa', "Wszystkie")
-        grouped_chunks = []
+        merge = {col: ('min' if col.startswith('min(') else 'max' if col.startswith('max(') else 'sum')
+                 for col in self._cube_spec()}
+        cube = pd.concat(partials, ignore_index=True).groupby(
+            self.cube_keys, observed=True, dropna=False).agg(merge).reset_index()
+        _write_part(cube, self._cube_path(folder_path))
 
-        for file in all_files:
-            try:
-                schema_cols = None
-                if pq is not None:
-                    try:
-                        schema_cols = pq.ParquetFile(file).schema.names
-                    except Exception:
-                        schema_cols = None
-
-                if schema_cols:
-                    if mode == 'efficiency':
-                        if selected_class != "Wszystkie":
-                            lav_cols = [f"Lav({selected_class})"]
-                            lav_cols = [c for c in lav_cols if c in schema_cols]
-                        else:
-                            lav_cols = [c for c in schema_cols if 'Lav' in c]
-                    else:
-                        lav_cols = []
-                    cols_to_read = list(base_cols.union(lav_cols))
-                    df = pd.read_parquet(file, columns=cols_to_read)
-                else:
-                    df = pd.read_parquet(file)
+    def _comparison_from_cubes(self, filters, mode):
+        """Odpowiada na zapytanie wykresów 1-3 z kostek agregatów (None, gdy się nie da).
 
-                if df.empty:
-                    continue
+        Wszystkie filtry GUI są kluczami kostki, więc wystarczy przefiltrować
+        kostki i zsumować liczniki. Foldery bez kostki (cache sprzed jej
+        wprowadzenia) dostają ją przy pierwszym zapytaniu.
+        """
+        # Kostka jest liczona dla MF odniesienia - z własnymi MF zmieniają się klasy
+        if self.active_mf:
+            return None
+        # De w skanowaniu jest liczone od nowa w każdym wierszu i zaokrąglane, a kostka
+        # ma sumy zaokrąglonych De dla czasu odniesienia - przeskalowanie nie daje tego samego
+        if mode == 'De' and self.active_burning_hours != REFERENCE_BURNING_HOURS:
+            return None
+        plan = _FilterPlan(filters)
+        if any(col not in self.cube_keys for col, _ in plan.text + plan.numeric):
+            return None
+        if mode == 'efficiency':
+            selected_class = filters.get('Klasa oświetleniowa', "Wszystkie")
+            if selected_class == "Wszystkie":
+                num_col = 'pass_any'
+            elif selected_class in NORMS:
+                num_col = f"pass({selected_class})"
+            else:
+                return None
+            den_col = 'n'
+        elif mode in self.cube_values:
+            num_col, den_col = f"sum({mode})", f"count({mode})"
+        else:
+            return None
 
-                # Filtry
-                selected_arrangement = filters.get('Rozmieszczenie', "Wszystkie")
-                if selected_arrangement != "Wszystkie":
-                    df['Arrangement'] = df['Arrangement'].astype(str).str.strip()
-                    df = df[df['Arrangement'] == selected_arrangement]
-
-                if filters.get('Nazwa oprawy') != "Wszystkie":
-                    df = df[df['Ldc name'] == filters.get('Nazwa oprawy')]
-
-                if filters.get('Klasa oświetleniowa') != "Wszystkie":
-                    df = df[df['best_class'] == filters.get('Klasa oświetleniowa')]
-
-                num_filters = {
-                    'Szerekość drogi [m]': 'Road W[m]',
-                    'Odstęp między oprawami [m]': 'Delta [m]',
-                    'Wysokość montażu [m]': 'Lph [m]',
-                    'Nachylenie (°)': 'Tilt [°]'
-                }
-                for nice_name, col_name in num_filters.items():
-                    val = filters.get(nice_name)
-                    if val and val != "Wszystkie":
-                        try:
-                            df = df[df[col_name] == float(val)]
-                        except (ValueError, TypeError):
-                            continue
+        if not os.path.isdir(self.cache_dir):
+            return None
+        folders = [entry.path for entry in os.scandir(self.cache_dir)
+                   if entry.is_dir() and not entry.name.startswith('.')]
+        folders = [f for f in folders
+                   if glob.glob(os.path.join(f, "**", "part_*.parquet"), recursive=True)]
+        for folder in folders:
+            if not os.path.exists(self._cube_path(folder)):
+                try:
+                    self.log(f"Budowanie kostki agregatów: {os.path.basename(folder)}", "info")
+                    self._write_summary_cube(folder)
+                except Exception as e:
+                    self.log(f"Brak kostki agregatów dla {os.path.basename(folder)}: {e}", "warning")
+                    return None
+
+        cubes = []
+        for folder in folders:
+            cube_path = self._cube_path(folder)
+            if pq is not None:
+                schema = self._file_schema(cube_path)
+                df = pq.read_table(cube_path, columns=['Arrangement', 'Road W[m]', num_col, den_col],
+                                   filters=plan.expression(schema)).to_pandas()
+            else:
+                df = plan.apply(pd.read_parquet(cube_path))
+            if not df.empty:
+                cubes.append(df[['Arrangement', 'Road W[m]', num_col, den_col]])
+
+        if not cubes:
+            return pd.DataFrame()
 
-                if df.empty:
-                    continue
+        keys = ['Arrangement', 'Road W[m]']
+        agg = pd.concat(cubes, ignore_index=True).groupby(keys, observed=True)[[num_col, den_col]].sum()
+        agg = agg[agg[den_col] > 0].reset_index()
+        agg['value'] = agg[num_col] / agg[den_col]
+        if mode == 'efficiency':
+            agg['value'] = agg['value'] * 100.0
+        return agg[['Arrangement', 'Road W[m]', 'value']]
 
-                if mode == 'efficiency':
-                    lav_cols = [c for c in df.columns if 'Lav' in c]
-                    if not lav_cols:
-                        continue
-                    is_valid = (df[lav_cols].max(axis=1) >= 100).astype(int)
-                    grouped = df.assign(is_valid=is_valid).groupby(
-                        ['Arrangement', 'Road W[m]']
-                    )['is_valid'].agg(['sum', 'count']).reset_index()
-                else:
-                    if mode not in df.columns:
-                        continue
-                    grouped = df.groupby(['Arrangement', 'Road W[m]'])[mode].agg(['sum', 'count']).reset_index()
+    def get_arrangement_comparison_data(self, filters, mode='efficiency'):
+        """Agreguje dane do wykresów 1-3 bez ładowania całej bazy."""
+        # Najpierw kostka agregatów - milisekundy zamiast skanowania wszystkich części
+        try:
+            from_cube = self._comparison_from_cubes(filters, mode)
+        except Exception as e:
+            self.log(f"Kostka agregatów niedostępna, skanuję części: {e}", "warning")
+            from_cube = None
+        if from_cube is not None:
+            return from_cube
 
-                grouped = grouped.rename(columns={'sum': 'val_sum', 'count': 'val_count'})
-                grouped_chunks.append(grouped)
-            except Exception:
-                continue
+        base_cols = {'Arrangement', 'Road W[m]', 'Ldc name', 'best_class', 'Delta [m]', 'Lph [m]', 'Tilt [°]'}
+        if mode in ('De', 'Dp'):
+            base_cols.add(mode)
+        base_cols.add('Total flux [lm]')
+        lav_columns = self._lav_columns_for(filters)
+
+        def columns_for(schema_cols):
+            if mode == 'efficiency':
+                return base_cols.union(lav_columns(schema_cols))
+            return base_cols
+
+        def value(df):
+            if mode == 'efficiency':
+                lav_cols = [c for c in df.columns if 'Lav' in c]
+                if not lav_cols:
+                    return None
+                return (df[lav_cols].max(axis=1) >= 100).astype(int)
+            if mode not in df.columns:
+                return None
+            # Sumy w float64, jak w kostce agregatów
+            return df[mode].astype('float64')
+
+        keys = ['Arrangement', 'Road W[m]']
+        grouped_chunks = self._scan_cache(filters, columns_for, self._groupby_reducer(keys, value))
 
         if not grouped_chunks:
             return pd.DataFrame()
 
         combined = pd.concat(grouped_chunks, ignore_index=True)
-        agg = combined.groupby(['Arrangement', 'Road W[m]'])[['val_sum', 'val_count']].sum().reset_index()
+        agg = combined.groupby(keys, observed=True)[['val_sum', 'val_count']].sum().reset_index()
 
         if mode == 'efficiency':
             agg['value'] = (agg['val_sum'] / agg['val_count']) * 100.0
         else:
             agg['value'] = agg['val_sum'] / agg['val_count']
 
-        return agg[['Arrangement', 'Road W[m]', 'value']]
\ No newline at end of file
+        return agg[['Arrangement', 'Road W[m]', 'value']]
@@ -4,6 +4,7 @@ from tkinter import filedialog, scrolledtext
 import os
 import glob
 import threading
+import time
 from datetime import datetime
 import plots
 
@@ -298,6 +299,23 @@ class AnalyzerGUI:
         self.ent_max_lav.insert(0, "0")
         self.ent_max_lav.grid(row=0, column=3)
 
+        tk.Label(main_params, text="Procesy robocze:", bg="#121212", fg="white").grid(row=1, column=0, padx=5,
+                                                                                      pady=5)
+        self.ent_workers = tk.Entry(main_params, width=10)
+        self.ent_workers.insert(0, str(min(4, os.cpu_count() or 1)))
+        self.ent_workers.grid(row=1, column=1)
+
+        tk.Label(main_params, text="Budżet pamięci [MB] (0=auto):", bg="#121212", fg="white").grid(row=2, column=0,
+                                                                                                   padx=5, pady=5)
+        self.ent_memory = tk.Entry(main_params, width=10)
+        self.ent_memory.insert(0, "0")
+        self.ent_memory.grid(row=2, column=1)
+
+        self.var_hive = tk.BooleanVar(value=False)
+        tk.Checkbutton(main_params, text="Partycjonowanie cache (hive)", variable=self.var_hive,
+                       bg="#121212", fg="white", selectcolor="#2a2a2a",
+                       activebackground="#121212").grid(row=1, column=2, columnspan=2, padx=5, sticky="w")
+
         # --- Sekcja Tabela MF ---
         tk.Label(sett_win, text="Współczynniki utrzymania (MF) dla opraw:", bg="#121212", fg="#569cd6").pack()
 
@@ -335,6 +353,9 @@ class AnalyzerGUI:
             config = {
                 "burning_hours": float(self.ent_burning.get()),
                 "max_lav_excess": float(self.ent_max_lav.get()),
+                "workers": max(1, int(self.ent_workers.get())),
+                "memory_budget_mb": max(0.0, float(self.ent_memory.get())),
+                "layout": "hive" if self.var_hive.get() else "flat",
                 "mf_map": {lum: float(ent.get()) for lum, ent in self.mf_entries.items()}
             }
         except ValueError:
@@ -347,6 +368,7 @@ class AnalyzerGUI:
         # Logujemy parametry do istniejącej konsoli
         self.console.log("PARAMETRY ZATWIERDZONE", "header")
         self.console.log(f"Czas świecenia: {config['burning_hours']}h", "info")
+        self.console.log(f"Procesy robocze: {config['workers']}", "info")
         self.console.log("Rozpoczynam obliczenia główne...", "info")
 
         def worker():
@@ -427,6 +449,7 @@ class AnalyzerGUI:
 
             # Przycisk, o który pytałeś wcześniej - teraz log "Wyświetlono 100 wierszy" trafi do GUI
             ("M2: LOSOWE 100 WIERSZY", self.show_random_100, "#2d2d2d"),
+            ("10. KONSOLA SQL", self.open_sql_console, "#1e3d59"),
             ("ZAMKNIJ PANEL", res_win.destroy, "#4b2121")
         ]
 
@@ -504,5 +527,68 @@ class AnalyzerGUI:
         else:
             self.log_message(message, "#00ff88")
 
+    def open_sql_console(self, max_rows=1000):
+        """Okno zapytań SQL (DuckDB) na widoku results - dla pytań, na które nie ma przycisku"""
+        top = tk.Toplevel(self.window)
+        top.title(f"Konsola SQL (widok: {self.engine.sql_view_name})")
+        top.geometry("1200x700")
+        top.config(bg="#1e1f22")
+
+        query_box = scrolledtext.ScrolledText(top, height=8, bg="#2b2d30", fg="white", insertbackground="white",
+                                              font=("Consolas", 10))
+        query_box.pack(fill="x", padx=10, pady=(10, 5))
+        query_box.insert("1.0", f"SELECT Arrangement, best_class, count(*) AS n, avg(De) AS De\n"
+                                f"FROM {self.engine.sql_view_name}\nGROUP BY ALL\nORDER BY ALL")
+
+        bar = tk.Frame(top, bg="#1e1f22")
+        bar.pack(fill="x", padx=10)
+        status = tk.Label(bar, text="Ctrl+Enter - wykonaj", bg="#1e1f22", fg="#aaaaaa", anchor="w")
+
+        table_frame = tk.Frame(top, bg="#1e1f22")
+        table_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        tree = ttk.Treeview(table_frame, show="headings")
+        vsb = ttk.Scrollbar(table_frame, orient="vertical", command=tree.yview)
+        hsb = ttk.Scrollbar(table_frame, orient="horizontal", command=tree.xview)
+        tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        tree.grid(row=0, column=0, sticky='nsew')
+        vsb.grid(row=0, column=1, sticky='ns')
+        hsb.grid(row=1, column=0, sticky='ew')
+        table_frame.grid_columnconfigure(0, weight=1)
+        table_frame.grid_rowconfigure(0, weight=1)
+
+        def show(df, elapsed):
+            btn.config(state="normal")
+            tree.delete(*tree.get_children())
+            cols = [str(c) for c in df.columns]
+            tree.configure(columns=cols)
+            for col in cols:
+                tree.heading(col, text=col)
+                tree.column(col, width=120, anchor="center")
+            for row in df.head(max_rows).itertuples(index=False):
+                tree.insert("", "end", values=[f"{v:.4f}" if isinstance(v, float) else v for v in row])
+            shown = f" (pokazano {max_rows})" if len(df) > max_rows else ""
+            status.config(text=f"{len(df)} wierszy{shown} w {elapsed:.2f}s")
+
+        def run():
+            query = query_box.get("1.0", "end").strip()
+            if not query:
+                return
+            btn.config(state="disabled")
+            status.config(text="Wykonywanie...")
+
+            # Zapytanie w tle - okno nie zamarza przy dużych grupowaniach
+            def worker():
+                t_start = time.time()
+                df = self.engine.sql(query)
+                elapsed = time.time() - t_start
+                top.after(0, lambda: show(df, elapsed))
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        btn = tk.Button(bar, text="WYKONAJ", command=run, bg="#00ff88", fg="black", font=("Arial", 9, "bold"))
+        btn.pack(side="left")
+        status.pack(side="left", padx=10)
+        query_box.bind("<Control-Return>", lambda e: (run(), "break")[1])
+
     def run(self):
         self.window.mainloop()
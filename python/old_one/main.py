@@ -1,11 +1,14 @@
 from gui import AnalyzerGUI
 from analysis import AnalysisCalculator
 
-# 1. Tworzymy mózg (kalkulator)
-analysis_calculator = AnalysisCalculator()
+# Strażnik jest wymagany przez procesy robocze (ProcessPoolExecutor),
+# które na Windowsie importują ten moduł od nowa
+if __name__ == "__main__":
+    # 1. Tworzymy mózg (kalkulator)
+    analysis_calculator = AnalysisCalculator()
 
-# 2. Tworzymy serce (GUI) i dajemy mu dostęp do mózgu
-app = AnalyzerGUI(engine=analysis_calculator)
+    # 2. Tworzymy serce (GUI) i dajemy mu dostęp do mózgu
+    app = AnalyzerGUI(engine=analysis_calculator)
 
-# 3. Odpalamy
-app.run()
+    # 3. Odpalamy
+    app.run()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Testy importują moduły aplikacji (analysis, z_generate_synthetic_relux_csv) z folderu nadrzędnego
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from analysis import AnalysisCalculator
+from z_generate_synthetic_relux_csv import _block_to_csv_bytes, build_luminaire_catalog, generate_block
+
+ALL = 'Wszystkie'
+FILTER_NAMES = ['Rozmieszczenie', 'Nazwa oprawy', 'Klasa oświetleniowa', 'Typ drogi', 'Liczba pasów',
+                'Szerekość drogi [m]', 'Odstęp między oprawami [m]', 'Wysokość montażu [m]', 'Nachylenie (°)']
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+@pytest.mark.parametrize("csv_engine", ["arrow", "pandas"])
+def test_padded_luminaire_name_matches_its_menu_entry(tmp_path, csv_engine):
+    if csv_engine == "arrow":
+        pytest.importorskip("pyarrow")
+    block = generate_block(0, 6000, '2lanes_SGL', build_luminaire_catalog(), np.random.default_rng(5))
+    padded = block['Ldc name'].iloc[0] + ' '
+    block.loc[block['Ldc name'] == block['Ldc name'].iloc[0], 'Ldc name'] = padded
+    expected_rows = int((block['Ldc name'] == padded).sum())
+    csv_path = tmp_path / "Padded.2lanes_SGL.street.batch.csv"
+    with open(csv_path, 'wb') as fh:
+        fh.write((';'.join(block.columns) + '\r\n').encode('cp1252'))
+        fh.write(_block_to_csv_bytes(block, 'cp1252'))
+
+    engine = AnalysisCalculator(cache_dir=str(tmp_path / "cache"))
+    engine.set_console(_QuietConsole())
+    engine.set_csv_files([str(csv_path)])
+    engine.calculate_results({"csv_engine": csv_engine})
+
+    assert padded in engine.get_unique_items()['Nazwa oprawy']
+    filters = dict({name: ALL for name in FILTER_NAMES}, **{'Nazwa oprawy': padded})
+    df = engine.get_filtered_data(filters)
+    assert len(df) == expected_rows
+    assert (df['Ldc name'].astype(str) == padded).all()
@@ -0,0 +1,28 @@
+import os
+
+from analysis import AnalysisCalculator
+
+
+def _write(path, data, mtime_ns):
+    with open(path, 'wb') as fh:
+        fh.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_fingerprint_detects_same_size_edit_outside_samples(tmp_path):
+    engine = AnalysisCalculator(cache_dir=str(tmp_path / "cache"))
+    path = str(tmp_path / "export.csv")
+    # Małe próbki: środek pliku (bajty 40-60) nie jest czytany przez odcisk
+    fingerprint = lambda: engine._file_fingerprint(path, edge_bytes=16, block_bytes=4, n_blocks=1)
+    data = b"a;b;c\r\n" + b"1.25;2.50;3.75\r\n" * 8
+
+    _write(path, data, 1_700_000_000_000_000_000)
+    original = fingerprint()
+    assert fingerprint() == original
+
+    edited = data[:45] + b"9" + data[46:]
+    _write(path, edited, 1_700_000_000_000_000_000)
+    assert fingerprint() == original  # te same próbki i ten sam czas - nie do odróżnienia
+
+    _write(path, edited, 1_700_000_001_000_000_000)
+    assert fingerprint() != original
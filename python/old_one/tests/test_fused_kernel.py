@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analysis
+from analysis import AnalysisCalculator
+from z_generate_synthetic_relux_csv import build_luminaire_catalog, generate_block
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+def _kernels():
+    kernels = [pytest.param(None, id="numpy")]
+    try:
+        import numba
+    except ImportError:
+        numba = None
+    if numba is not None:
+        kernels.append(pytest.param(analysis._fused_kernel_jit, id="numba"))
+    else:
+        kernels.append(pytest.param(None, id="numba", marks=pytest.mark.skip(reason="brak pakietu numba")))
+    return kernels
+
+
+def _chunk(engine, street='2lanes_OPP', n_rows=5000):
+    """Kawałek jak z czytnika CSV, z wierszami o zerowej szerokości drogi i zerowym odstępie"""
+    block = generate_block(0, n_rows, street, build_luminaire_catalog(), np.random.default_rng(3))
+    chunk = engine._coerce_chunk_types(block[engine.chosen_columns].copy())
+    chunk.loc[::97, 'Road W[m]'] = 0
+    chunk.loc[5::89, 'Delta [m]'] = 0
+    chunk.loc[7::83, ['Road W[m]', 'Delta [m]']] = 0
+    return chunk
+
+
+@pytest.mark.parametrize("kernel", _kernels())
+@pytest.mark.parametrize("street", ['2lanes_SGL', '2lanes_OPP', '2lanes_STG'])
+def test_fused_kernel_matches_pandas_path(tmp_path, monkeypatch, kernel, street):
+    monkeypatch.setattr(analysis, "_fused_kernel_jit", kernel)
+    engine = AnalysisCalculator(cache_dir=str(tmp_path))
+    engine.set_console(_QuietConsole())
+    chunk = _chunk(engine, street)
+    assert engine._fused_inputs_ok(chunk)
+
+    engine.transform_engine = "pandas"
+    expected = engine._transform_chunk(chunk.copy())
+    engine.transform_engine = "fused"
+    actual = engine._transform_chunk(chunk.copy())
+
+    assert list(actual.columns) == list(expected.columns)
+    for col in expected.columns:
+        pd.testing.assert_series_equal(actual[col], expected[col], check_exact=True, obj=col)
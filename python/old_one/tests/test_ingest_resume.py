@@ -0,0 +1,65 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+import analysis
+from analysis import AnalysisCalculator
+from z_generate_synthetic_relux_csv import _block_to_csv_bytes, build_luminaire_catalog, generate_block
+
+pytest.importorskip("pyarrow")
+
+N_ROWS = 60000
+CONFIG = {"layout": "hive", "pipeline_depth": 0, "memory_budget_mb": 2}
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+def _sorted_csv(path, n_rows=N_ROWS):
+    """Eksport posortowany po siatce - kolejne kawałki trafiają do innych katalogów partycji"""
+    block = generate_block(0, n_rows, '2lanes_OPP', build_luminaire_catalog(), np.random.default_rng(1))
+    block = block.sort_values(['Road W[m]', 'Lph [m]', 'Delta [m]'], kind='stable')
+    with open(path, 'wb') as fh:
+        fh.write((';'.join(block.columns) + '\r\n').encode('cp1252'))
+        fh.write(_block_to_csv_bytes(block, 'cp1252'))
+    return str(path)
+
+
+def _engine(cache_dir, csv_path):
+    engine = AnalysisCalculator(cache_dir=str(cache_dir))
+    engine.set_console(_QuietConsole())
+    engine.min_chunk_rows = 1000
+    engine.set_csv_files([csv_path])
+    return engine
+
+
+def test_hive_resume_after_crash_mid_chunk(tmp_path, monkeypatch):
+    csv_path = _sorted_csv(tmp_path / "Synthetic.2lanes_OPP.street.batch.csv")
+    cache_dir = tmp_path / "cache"
+
+    # Przerwanie w połowie zapisu części 3: część katalogów partycji ma już part_3.parquet
+    write_part = analysis._write_part
+    calls = {"n": 0}
+
+    def crashing_write_part(df, part_path, row_group_size=None):
+        if os.path.basename(part_path) == "part_3.parquet":
+            calls["n"] += 1
+            if calls["n"] == 13:
+                raise OSError("symulowana awaria zapisu")
+        write_part(df, part_path, row_group_size)
+
+    monkeypatch.setattr(analysis, "_write_part", crashing_write_part)
+    _engine(cache_dir, csv_path).calculate_results(CONFIG)
+    staging = glob.glob(os.path.join(str(cache_dir), ".*.tmp"))
+    assert staging and glob.glob(os.path.join(staging[0], "**", "part_3.parquet"), recursive=True)
+
+    monkeypatch.setattr(analysis, "_write_part", write_part)
+    engine = _engine(cache_dir, csv_path)
+    engine.calculate_results(CONFIG)
+
+    assert len(engine.get_all_data()) == N_ROWS
+    assert engine._load_manifest()["entries"].popitem()[1]["rows"] == N_ROWS
@@ -0,0 +1,21 @@
+import time
+
+import numpy as np
+import pytest
+
+from analysis import _current_rss_bytes, _IngestStats
+
+
+@pytest.mark.skipif(_current_rss_bytes() is None, reason="brak pomiaru RSS na tej platformie")
+def test_stage_peak_includes_memory_freed_before_the_stage_ends():
+    stats = _IngestStats()
+    size = 200 * 1024 * 1024
+    with stats.stage("plik.csv", 0, "transform"):
+        start = _current_rss_bytes()
+        block = np.ones(size, dtype=np.uint8)
+        time.sleep(10 * stats.sample_interval)
+        del block
+    record = stats.records[0]
+    assert record["rss_peak"] >= start + size * 0.9
+    assert _current_rss_bytes() < record["rss_peak"]
+    assert stats.summary()[0]["rss_peak"] == record["rss_peak"]
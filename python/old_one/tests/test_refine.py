@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from analysis import AnalysisCalculator
+from z_generate_synthetic_relux_csv import generate_dataset
+
+pytest.importorskip("pyarrow")
+
+ALL = 'Wszystkie'
+FILTER_NAMES = ['Rozmieszczenie', 'Nazwa oprawy', 'Klasa oświetleniowa', 'Typ drogi', 'Liczba pasów',
+                'Szerekość drogi [m]', 'Odstęp między oprawami [m]', 'Wysokość montażu [m]', 'Nachylenie (°)']
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("refine")
+    csv_files = generate_dataset(str(folder / "csv"), 20000, ['2lanes_SGL', '2lanes_OPP'])
+    engine = AnalysisCalculator(cache_dir=str(folder / "cache"))
+    engine.set_console(_QuietConsole())
+    engine.set_csv_files(csv_files)
+    engine.calculate_results({})
+    return engine
+
+
+def _refined_and_scanned(engine, broad, narrow):
+    engine._clear_results()
+    engine.get_filtered_data(broad)
+    refine = engine._refine_cached_result
+    calls = []
+    engine._refine_cached_result = lambda *args: calls.append(refine(*args)) or calls[-1]
+    try:
+        refined = engine.get_filtered_data(narrow)
+    finally:
+        engine._refine_cached_result = refine
+    assert calls and calls[0] is not None
+    engine._clear_results()
+    return refined, engine.get_filtered_data(narrow)
+
+
+def _filters():
+    return {name: ALL for name in FILTER_NAMES}
+
+
+@pytest.fixture(autouse=True)
+def default_config(engine):
+    yield
+    engine.set_active_config({}, 4000.0)
+    engine._clear_results()
+
+
+def test_narrowed_class_matches_scan(engine):
+    refined, scanned = _refined_and_scanned(engine, _filters(), {**_filters(), 'Klasa oświetleniowa': 'M4'})
+    assert list(refined.columns) == list(scanned.columns)
+    pd.testing.assert_frame_equal(refined, scanned)
+
+
+@pytest.mark.parametrize("name", ['Szerekość drogi [m]', 'Nachylenie (°)'])
+def test_float32_numeric_filter_matches_scan(engine, name):
+    value = engine.get_unique_items()[name][1]
+    refined, scanned = _refined_and_scanned(engine, _filters(), {**_filters(), name: value})
+    assert len(scanned) > 0
+    pd.testing.assert_frame_equal(refined, scanned)
+
+
+def test_class_filter_with_custom_mf_matches_scan(engine):
+    menu = engine.get_unique_items()
+    catalog = {lum["Ldc name"]: lum for lum in engine._luminaire_by_id().values()}
+    engine.set_active_config({engine._luminaire_key(n, catalog[n]["Lamp info"]): 0.6
+                              for n in menu['Nazwa oprawy'][1::3]}, 3300.0)
+    broad = {**_filters(), 'Rozmieszczenie': menu['Rozmieszczenie'][1]}
+    refined, scanned = _refined_and_scanned(engine, broad, {**broad, 'Klasa oświetleniowa': 'M3'})
+    assert len(scanned) > 0
+    pd.testing.assert_frame_equal(refined, scanned)
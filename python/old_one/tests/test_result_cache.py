@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import AnalysisCalculator, _read_only_view, _ResultCache
+from z_generate_synthetic_relux_csv import generate_dataset
+
+pytest.importorskip("pyarrow")
+
+ALL = 'Wszystkie'
+FILTER_NAMES = ['Rozmieszczenie', 'Nazwa oprawy', 'Klasa oświetleniowa', 'Typ drogi', 'Liczba pasów',
+                'Szerekość drogi [m]', 'Odstęp między oprawami [m]', 'Wysokość montażu [m]', 'Nachylenie (°)']
+SELECTION = {"files": [("part_0.parquet", (0, 0), [0], b"\x01")], "columns": ["x"]}
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+def _frame(rows=1000):
+    return pd.DataFrame({"x": np.arange(rows, dtype=np.float64)})
+
+
+def _nbytes(frame):
+    return int(frame.memory_usage(index=False, deep=True).sum())
+
+
+def _assert_totals(cache):
+    memory = sum(e["nbytes"] for e in cache.entries.values() if e["kind"] != "spill")
+    spill = sum(e["nbytes"] for e in cache.entries.values() if e["kind"] == "spill")
+    assert (cache.memory_bytes(), cache.spill_bytes()) == (memory, spill)
+
+
+def test_least_recently_used_frame_is_evicted_first():
+    cache = _ResultCache(2 * _nbytes(_frame()))
+    cache.put("a", _frame())
+    cache.put("b", _frame())
+    cache.get("a")
+    cache.put("c", _frame())
+    assert list(cache.entries) == ["a", "c"]
+    _assert_totals(cache)
+
+
+def test_frame_is_demoted_to_spill_then_selection_then_dropped(tmp_path):
+    spill_dir = str(tmp_path / "spill")
+    frame = _frame()
+    selection_bytes = _ResultCache(0)._selection_entry(SELECTION)["nbytes"]
+    cache = _ResultCache(_nbytes(frame) + 2 * selection_bytes, spill_dir, max_spill_bytes=10 ** 6)
+    cache.put("a", frame, SELECTION)
+    cache.put("b", _frame(), SELECTION)
+    assert cache.entries["a"]["kind"] == "spill"
+    spilled = cache.entries["a"]["value"]
+    pd.testing.assert_frame_equal(pd.read_parquet(spilled), frame)
+    _assert_totals(cache)
+
+    cache.max_spill_bytes = 0
+    cache.put("c", _frame(), SELECTION)
+    assert [cache.entries[k]["kind"] for k in "abc"] == ["selection", "selection", "frame"]
+    assert not os.path.exists(spilled)
+    _assert_totals(cache)
+
+    cache.max_bytes = selection_bytes
+    cache._evict()
+    assert list(cache.entries) == ["c"]
+    assert cache.entries["c"]["kind"] == "selection"
+    _assert_totals(cache)
+
+
+def test_frame_without_selection_is_dropped_when_it_does_not_fit():
+    cache = _ResultCache(_nbytes(_frame()))
+    cache.put("a", _frame())
+    cache.put("b", _frame())
+    assert list(cache.entries) == ["b"]
+    cache.put("c", _frame(5000))
+    assert list(cache.entries) == ["b"]
+    _assert_totals(cache)
+
+
+def test_spill_folder_is_cleared_on_creation(tmp_path):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    (spill_dir / "stale.parquet").write_bytes(b"")
+    _ResultCache(1024, str(spill_dir), max_spill_bytes=1024)
+    assert not spill_dir.exists()
+
+
+def test_read_only_view_does_not_change_the_cached_frame():
+    frame = _frame(10)
+    view = _read_only_view(frame)
+    view.loc[0, "x"] = -1.0
+    view["y"] = 1
+    assert frame.loc[0, "x"] == 0.0
+    assert list(frame.columns) == ["x"]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("results")
+    csv_files = generate_dataset(str(folder / "csv"), 20000, ['2lanes_SGL', '2lanes_OPP'])
+    engine = AnalysisCalculator(cache_dir=str(folder / "cache"))
+    engine.set_console(_QuietConsole())
+    engine.set_csv_files(csv_files)
+    engine.calculate_results({})
+    return engine
+
+
+def test_selection_is_rehydrated_to_the_same_result(engine):
+    engine.result_cache_mb = 0.01
+    engine._clear_results()
+    try:
+        filters = dict({name: ALL for name in FILTER_NAMES}, **{'Klasa oświetleniowa': 'M4'})
+        first = engine.get_filtered_data(filters)
+        entry = engine._result_cache().get(engine._filters_cache_key(filters))
+        assert entry["kind"] == "selection"
+        pd.testing.assert_frame_equal(engine.get_filtered_data(filters), first)
+    finally:
+        engine.result_cache_mb = None
+        engine._clear_results()
+
+
+def test_caller_changes_do_not_reach_the_cached_result(engine):
+    filters = {name: ALL for name in FILTER_NAMES}
+    first = engine.get_filtered_data(filters)
+    expected = first.copy(deep=True)
+    first.loc[0, 'De'] = -1.0
+    first['extra'] = 0
+    pd.testing.assert_frame_equal(engine.get_filtered_data(filters), expected)
@@ -0,0 +1,56 @@
+import io
+import random
+
+import numpy as np
+
+from z_leave_only_100k_rows_csv import _reservoir_sample, _stratified_sample, extract_random_sample
+
+STRATA = {b'A': 6000, b'B': 3000, b'C ': 990, b'D': 10}
+
+
+def _lines():
+    rng = random.Random(3)
+    keys = [key for key, count in STRATA.items() for _ in range(count)]
+    rng.shuffle(keys)
+    return [b'%d;%s;%.3f\r\n' % (i, key, rng.random()) for i, key in enumerate(keys)]
+
+
+def test_reservoir_sample_has_requested_size_of_distinct_lines():
+    lines = _lines()
+    sample = _reservoir_sample(iter(lines), 500, random.Random(1))
+    assert len(sample) == 500
+    assert len({idx for idx, _ in sample}) == 500
+    assert all(lines[idx] == line for idx, line in sample)
+
+
+def test_reservoir_sample_of_short_input_returns_everything():
+    lines = _lines()[:20]
+    assert _reservoir_sample(iter(lines), 500, random.Random(1)) == list(enumerate(lines))
+
+
+def test_stratified_sample_covers_every_stratum_proportionally():
+    lines = _lines()
+    # Małe partie - progi i przycinanie kandydatów działają wiele razy w jednym przebiegu
+    sample, counts = _stratified_sample(io.BytesIO(b''.join(lines)), 1000, 1, np.random.default_rng(1),
+                                        batch_bytes=4096)
+    assert counts == {b'A': 6000, b'B': 3000, b'C': 990, b'D': 10}
+    assert len(sample) == 1000
+    assert len({idx for idx, _ in sample}) == 1000
+    assert all(lines[idx] == line for idx, line in sample)
+    per_stratum = {}
+    for _, line in sample:
+        key = line.split(b';')[1].strip()
+        per_stratum[key] = per_stratum.get(key, 0) + 1
+    assert per_stratum == {b'A': 600, b'B': 300, b'C': 99, b'D': 1}
+
+
+def test_extract_random_sample_keeps_header_and_source_order(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_bytes(b'Nr;Street;Value\r\n' + b''.join(_lines()))
+    target = tmp_path / "out.csv"
+    extract_random_sample(str(source), str(target), n_samples=200, stratify_by='Street')
+    out = target.read_bytes().splitlines()
+    assert out[0] == b'Nr;Street;Value'
+    numbers = [int(line.split(b';')[0]) for line in out[1:]]
+    assert len(numbers) == 200
+    assert numbers == sorted(numbers)
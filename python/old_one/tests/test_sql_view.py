@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import AnalysisCalculator
+from z_generate_synthetic_relux_csv import generate_dataset
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("duckdb")
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("sql")
+    csv_files = generate_dataset(str(folder / "csv"), 30000, ['2lanes_SGL', '2lanes_OPP'])
+    engine = AnalysisCalculator(cache_dir=str(folder / "cache"))
+    engine.set_console(_QuietConsole())
+    engine.set_csv_files(csv_files)
+    engine.calculate_results({})
+    # Widok SQL czyta pliki posortowane - get_all_data musi skleić je w tej samej kolejności
+    files = sorted(engine._cache_part_files())
+    engine._cache_part_files = lambda: files
+    return engine
+
+
+def _assert_same_columns(sql_df, pandas_df):
+    assert list(sql_df.columns) == list(pandas_df.columns)
+    assert len(sql_df) == len(pandas_df)
+    for col in pandas_df.columns:
+        expected, got = pandas_df[col], sql_df[col]
+        if pd.api.types.is_numeric_dtype(expected):
+            expected = expected.to_numpy(dtype=np.float64)
+            got = got.to_numpy(dtype=np.float64)
+            assert np.array_equal(expected, got, equal_nan=True), \
+                f"{col}: {np.count_nonzero(~np.isclose(expected, got, rtol=0, atol=0, equal_nan=True))} różnych wierszy"
+        else:
+            assert (expected.astype(str).to_numpy() == got.astype(str).to_numpy()).all(), col
+
+
+@pytest.mark.parametrize("mf, burning_hours", [(None, 4000.0), (0.65, 3300.0), (0.9, 4100.0)])
+def test_sql_view_matches_get_all_data(engine, mf, burning_hours):
+    names = engine.get_unique_items()['Nazwa oprawy'][1:]
+    catalog = {lum["Ldc name"]: lum for lum in engine._luminaire_by_id().values()}
+    mf_map = {engine._luminaire_key(n, catalog[n]["Lamp info"]): mf for n in names[::3]} if mf else {}
+    engine.set_active_config(mf_map, burning_hours)
+
+    _assert_same_columns(engine.sql("SELECT * FROM results"), engine.get_all_data())
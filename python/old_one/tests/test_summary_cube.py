@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import AnalysisCalculator
+from z_generate_synthetic_relux_csv import generate_dataset
+
+pytest.importorskip("pyarrow")
+
+ALL = 'Wszystkie'
+FILTER_NAMES = ['Rozmieszczenie', 'Nazwa oprawy', 'Klasa oświetleniowa', 'Typ drogi', 'Liczba pasów',
+                'Szerekość drogi [m]', 'Odstęp między oprawami [m]', 'Wysokość montażu [m]', 'Nachylenie (°)']
+
+
+class _QuietConsole:
+    def log(self, message, level="info"):
+        pass
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("cube")
+    csv_files = generate_dataset(str(folder / "csv"), 20000, ['2lanes_SGL', '2lanes_OPP', '2lanes_STG'])
+    engine = AnalysisCalculator(cache_dir=str(folder / "cache"))
+    engine.set_console(_QuietConsole())
+    engine.set_csv_files(csv_files)
+    engine.calculate_results({})
+    return engine
+
+
+def _scan_only(engine, filters, mode):
+    cube = engine._comparison_from_cubes
+    engine._comparison_from_cubes = lambda *args: None
+    try:
+        return engine.get_arrangement_comparison_data(filters, mode)
+    finally:
+        engine._comparison_from_cubes = cube
+
+
+@pytest.mark.parametrize("mf, burning_hours", [(None, 4000.0), (None, 3300.0), (0.65, 4000.0), (0.65, 3300.0)])
+@pytest.mark.parametrize("mode", ['efficiency', 'De', 'Dp'])
+@pytest.mark.parametrize("narrow", [False, True], ids=["all", "narrow"])
+def test_cube_matches_scan(engine, mf, burning_hours, mode, narrow):
+    menu = engine.get_unique_items()
+    mf_map = {}
+    if mf:
+        catalog = {lum["Ldc name"]: lum for lum in engine._luminaire_by_id().values()}
+        mf_map = {engine._luminaire_key(n, catalog[n]["Lamp info"]): mf for n in menu['Nazwa oprawy'][1::4]}
+    engine.set_active_config(mf_map, burning_hours)
+
+    filters = {name: ALL for name in FILTER_NAMES}
+    if narrow:
+        filters.update({'Klasa oświetleniowa': 'M5', 'Wysokość montażu [m]': menu['Wysokość montażu [m]'][2]})
+    expected = _scan_only(engine, filters, mode)
+    actual = engine.get_arrangement_comparison_data(filters, mode)
+
+    key = ['Arrangement', 'Road W[m]']
+    expected = expected.astype({'Arrangement': str}).sort_values(key, ignore_index=True)
+    actual = actual.astype({'Arrangement': str}).sort_values(key, ignore_index=True)
+    pd.testing.assert_frame_equal(actual[key], expected[key], check_dtype=False)
+    np.testing.assert_allclose(actual['value'].to_numpy(), expected['value'].to_numpy(), rtol=1e-9)
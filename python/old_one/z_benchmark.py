@@ -0,0 +1,243 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import AnalysisCalculator, _peak_rss_bytes
+from z_generate_synthetic_relux_csv import generate_dataset, streets
+
+# --- KONFIGURACJA ŚCIEŻEK ---
+base_path = os.path.dirname(__file__)
+bench_dir = os.path.join(base_path, 'data', 'benchmark')
+baseline_file = os.path.join(bench_dir, 'baseline.json')
+
+# Domyślne parametry przebiegu (można nadpisać z linii poleceń)
+rows_per_file = 200000
+repeats = 5
+# Względna zmiana mediany, od której wynik uznajemy za regresję / poprawę
+tolerance = 0.15
+# ...ale tylko gdy różnica jest większa niż tyle milisekund (szum pomiarów bardzo krótkich operacji)
+min_delta_ms = 5.0
+
+ALL = 'Wszystkie'
+FILTER_NAMES = ['Rozmieszczenie', 'Nazwa oprawy', 'Typ drogi', 'Liczba pasów', 'Klasa oświetleniowa',
+                'Szerekość drogi [m]', 'Odstęp między oprawami [m]', 'Wysokość montażu [m]', 'Nachylenie (°)']
+
+
+class _QuietConsole:
+    """Konsola zbierająca logi silnika - benchmark wypisuje tylko własne wyniki"""
+
+    def __init__(self):
+        self.records = []
+
+    def log(self, message, level="info"):
+        self.records.append((message, level))
+
+
+def _percentiles(samples):
+    samples = np.asarray(samples, dtype=np.float64)
+    return {"p50": float(np.percentile(samples, 50)), "p95": float(np.percentile(samples, 95)),
+            "max": float(samples.max()), "n": int(len(samples))}
+
+
+def _measure(fn, repeats, reset=None):
+    """Czas wywołań fn() w sekundach; reset() przed każdym pomiarem (np. czyszczenie cache wyników)"""
+    samples = []
+    result = None
+    for _ in range(repeats):
+        if reset is not None:
+            reset()
+        t_start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t_start)
+    return samples, result
+
+
+def prepare_dataset(n_rows):
+    """Syntetyczne pliki CSV dla danej liczby wierszy - generowane tylko raz"""
+    folder = os.path.join(bench_dir, f'csv_{n_rows}')
+    paths = sorted(glob.glob(os.path.join(folder, '*.csv')))
+    if len(paths) != len(streets):
+        print(f"Generowanie danych syntetycznych ({len(streets)} x {n_rows} wierszy)...")
+        paths = generate_dataset(folder, n_rows, streets)
+    return paths
+
+
+def run_benchmark(n_rows, repeats, config=None, plots=False):
+    """Mierzy ingestię i zapytania GUI na danych syntetycznych; zwraca słownik wyników"""
+    config = config or {}
+    csv_files = prepare_dataset(n_rows)
+    total_rows = n_rows * len(csv_files)
+    cache_dir = os.path.join(bench_dir, 'cache')
+    metrics = {}
+
+    # --- 1. Ingestia (za każdym razem od pustego cache) ---
+    engine = None
+
+    def reset_cache():
+        nonlocal engine
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        engine = AnalysisCalculator(cache_dir=cache_dir)
+        engine.set_console(_QuietConsole())
+        engine.set_csv_files(csv_files)
+
+    samples, _ = _measure(lambda: engine.calculate_results(config), max(1, repeats // 2), reset_cache)
+    metrics["calculate_results"] = dict(_percentiles(samples), rows_per_s=total_rows / np.median(samples))
+    print(f"Ingestia: {total_rows} wierszy, mediana {np.median(samples):.2f}s")
+
+    # --- 2. Zapytania (na zimno - bez cache wyników w pamięci i indeksu filtrów na dysku) ---
+    def reset_queries():
+        engine.set_csv_files(csv_files)
+        if os.path.exists(engine._filters_index_cache_file):
+            os.remove(engine._filters_index_cache_file)
+
+    samples, menu = _measure(engine.get_unique_items, repeats, reset_queries)
+    metrics["get_unique_items"] = _percentiles(samples)
+
+    # Filtry wybierane z danych: wszystko, jeden układ oraz wąski wybór jak w typowej analizie
+    everything = {name: ALL for name in FILTER_NAMES}
+    pick = lambda name, i=1: menu.get(name, [ALL])[min(i, len(menu.get(name, [ALL])) - 1)]
+    queries = {
+        "all": everything,
+        "arrangement": dict(everything, **{'Rozmieszczenie': pick('Rozmieszczenie')}),
+        "narrow": dict(everything, **{'Rozmieszczenie': pick('Rozmieszczenie'),
+                                      'Klasa oświetleniowa': pick('Klasa oświetleniowa'),
+                                      'Szerekość drogi [m]': pick('Szerekość drogi [m]')}),
+    }
+    for name, filters in queries.items():
+        samples, df = _measure(lambda: engine.get_filtered_data(filters), repeats, reset_queries)
+        metrics[f"get_filtered_data[{name}]"] = dict(_percentiles(samples), rows=len(df),
+                                                      rows_per_s=len(df) / np.median(samples))
+        # Ponowne zapytanie z tymi samymi filtrami - z cache wyników w pamięci
+        samples, _ = _measure(lambda: engine.get_filtered_data(filters), repeats)
+        metrics[f"get_filtered_data[{name}, cache]"] = _percentiles(samples)
+
+    for mode in ('efficiency', 'De', 'Dp'):
+        for name in ("all", "narrow"):
+            samples, _ = _measure(lambda: engine.get_arrangement_comparison_data(queries[name], mode), repeats,
+                                  reset_queries)
+            metrics[f"get_arrangement_comparison_data[{mode}, {name}]"] = _percentiles(samples)
+
+    # --- 3. Rysowanie wykresów (opcjonalnie, bez okien - backend Agg) ---
+    if plots:
+        metrics.update(_measure_plots(engine, queries, repeats))
+
+    peak = _peak_rss_bytes()
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "rows": total_rows,
+            "files": len(csv_files),
+            "repeats": repeats,
+            "config": config,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "peak_rss_mb": peak / (1024 * 1024) if peak is not None else None,
+        "metrics": metrics,
+    }
+
+
+def _measure_plots(engine, queries, repeats):
+    """Czas przygotowania danych i rysowania wykresów 1-9 (jak przyciski w GUI)"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import plots
+    except ImportError as e:
+        print(f"Pomijam wykresy - brak pakietu: {e}")
+        return {}
+
+    plots.set_logger(lambda message, level="info": None)
+    plt.show = lambda *args, **kwargs: plt.close('all')
+    filters = queries["narrow"]
+    class_name = filters['Klasa oświetleniowa']
+    charts = {
+        "plot[1-3 comparison]": lambda: plots.draw_arrangement_comparison_agg(
+            engine.get_arrangement_comparison_data(filters, 'efficiency'), 'efficiency'),
+        "plot[4-6 top20]": lambda: plots.draw_top20_fixtures(engine.get_filtered_data(filters),
+                                                             filters['Rozmieszczenie']),
+        "plot[7 flux balance]": lambda: plots.draw_flux_balance(engine.get_filtered_data(filters), class_name),
+        "plot[8 Dp boxplot]": lambda: plots.draw_dp_boxplot(engine.get_filtered_data(filters), class_name),
+        "plot[9 De histogram]": lambda: plots.draw_de_histogram(engine.get_filtered_data(filters)),
+    }
+    results = {}
+    for name, draw in charts.items():
+        samples, _ = _measure(draw, repeats)
+        results[name] = _percentiles(samples)
+    return results
+
+
+def print_results(results, baseline=None):
+    """Tabela wyników; z baseline dodaje stosunek median i oznacza regresje. Zwraca liczbę regresji."""
+    meta = results["meta"]
+    print(f"\nWyniki: {meta['rows']} wierszy w {meta['files']} plikach, powtórzenia: {meta['repeats']}, "
+          f"config: {meta['config']}")
+    if baseline and baseline["meta"].get("rows") != meta["rows"]:
+        print(f"Uwaga: baseline ma {baseline['meta'].get('rows')} wierszy - porównanie może być mylące")
+
+    regressions = 0
+    print(f"{'pomiar':<52}{'p50 [ms]':>10}{'p95 [ms]':>10}{'wiersze/s':>14}  vs baseline")
+    for name, m in results["metrics"].items():
+        rate = f"{m['rows_per_s']:,.0f}" if m.get("rows_per_s") else "-"
+        change = ""
+        base = (baseline or {}).get("metrics", {}).get(name)
+        if base and base["p50"] > 0:
+            ratio = m["p50"] / base["p50"]
+            change = f"x{ratio:.2f}"
+            significant = abs(m["p50"] - base["p50"]) * 1000 > min_delta_ms
+            if significant and ratio > 1 + tolerance:
+                change += " REGRESJA"
+                regressions += 1
+            elif significant and ratio < 1 - tolerance:
+                change += " poprawa"
+        print(f"{name:<52}{m['p50'] * 1000:>10.1f}{m['p95'] * 1000:>10.1f}{rate:>14}  {change}")
+    if results.get("peak_rss_mb") is not None:
+        base_rss = (baseline or {}).get("peak_rss_mb")
+        extra = f" (baseline: {base_rss:.0f} MB)" if base_rss else ""
+        print(f"Szczyt pamięci (RSS): {results['peak_rss_mb']:.0f} MB{extra}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestii i zapytań na syntetycznych eksportach Reluxa")
+    parser.add_argument("--rows", type=int, default=rows_per_file, help="liczba wierszy na plik")
+    parser.add_argument("--repeats", type=int, default=repeats, help="liczba powtórzeń każdego pomiaru")
+    parser.add_argument("--config", default="{}", help='config dla calculate_results jako JSON, np. \'{"workers": 2}\'')
+    parser.add_argument("--plots", action="store_true", help="mierz też rysowanie wykresów (wymaga matplotlib)")
+    parser.add_argument("--save-baseline", action="store_true", help="zapisz wyniki jako baseline")
+    parser.add_argument("--compare", nargs="?", const=baseline_file, default=None, metavar="PLIK",
+                        help="porównaj z baseline (domyślnie data/benchmark/baseline.json)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rows, args.repeats, json.loads(args.config), args.plots)
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, "r", encoding="utf-8") as fh:
+                baseline = json.load(fh)
+        except FileNotFoundError:
+            print(f"Błąd: Brak pliku baseline: {args.compare}")
+    regressions = print_results(results, baseline)
+
+    with open(os.path.join(bench_dir, 'last_run.json'), "w", encoding="utf-8") as fh:
+        json.dump(results, fh, ensure_ascii=False, indent=1)
+    if args.save_baseline:
+        with open(baseline_file, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, ensure_ascii=False, indent=1)
+        print(f"Zapisano baseline: {baseline_file}")
+
+    if regressions:
+        print(f"\n{regressions} pomiarów wolniejszych o ponad {tolerance * 100:.0f}% niż baseline")
+        sys.exit(1)
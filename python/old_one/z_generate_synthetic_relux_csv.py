@@ -0,0 +1,195 @@
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import NORMS
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+# --- KONFIGURACJA ŚCIEŻEK ---
+base_path = os.path.dirname(__file__)
+output_dir = os.path.join(base_path, 'data', 'synthetic')
+
+# Liczba wierszy na plik i ulice (jeden plik na układ, jak w eksportach batch z Reluxa)
+rows_per_file = 1000000
+streets = ['2lanes_SGL', '2lanes_OPP', '2lanes_STG']
+# Kodowanie eksportu: 'cp1252' (tak czyta analysis.py) albo 'cp1250'
+encoding = 'cp1252'
+# Kolumny-wypełniacze udające resztę szerokiego eksportu (aplikacja ich nie czyta)
+extra_columns = 35
+
+# Kolumny eksportu batch, które zna aplikacja (kolejność jak w Reluxie)
+RELUX_COLUMNS = [
+    'Ldc name', 'Ldc type', 'Lamp info', 'Total flux [lm]', 'Total power [W]', 'Street',
+    'Power/km  [W/km]', 'Road W[m]', 'Lum pos y [m]', 'Lph [m]', 'Delta [m]', 'Tilt [°]',
+    'Lav [cd/m2]', 'Lmin [cd/m2]', 'Lmax [cd/m2]', 'Uo (L)', 'Uow (L)', 'Ul', 'TI [%]', 'Rei',
+    'Em [lx]', 'Eav [lx]', 'Emin [lx]', 'Emax [lx]', 'Uo (E)', 'class', 'valid',
+]
+
+# Siatka czynnikowa geometrii - Relux liczy każdą kombinację dla każdej oprawy
+GRID = {
+    'Road W[m]': [6.0, 7.0, 7.5, 9.0, 10.5, 12.0],
+    'Lum pos y [m]': [-1.0, -0.5, 0.0],
+    'Lph [m]': [6.0, 8.0, 10.0, 12.0],
+    'Delta [m]': [25.0, 30.0, 35.0, 40.0, 45.0],
+    'Tilt [°]': [0.0, 5.0, 10.0, 15.0],
+}
+
+# Liczba opraw na jeden odstęp Delta w danym układzie
+LUMINAIRES_PER_SPAN = {'SGL': 1, 'OPP': 2, 'STG': 1}
+
+
+def build_luminaire_catalog(n_luminaires=40, seed=7):
+    """Losowy, ale powtarzalny katalog opraw: nazwa, lampa, moc, strumień i współczynnik wykorzystania."""
+    rng = np.random.default_rng(seed)
+    families = ['ALFA', 'BETA', 'GAMMA', 'DELTA', 'OMEGA', 'SIGMA', 'ÓPTIMA', 'CITÉ']
+    catalog = []
+    for i in range(n_luminaires):
+        power = float(rng.choice([18, 24, 30, 36, 45, 56, 70, 90, 120, 150]))
+        efficacy = rng.uniform(110, 175)
+        cct = int(rng.choice([2700, 3000, 4000]))
+        catalog.append({
+            'Ldc name': f"{families[i % len(families)]} {i // len(families) + 1} O{int(rng.integers(11, 40))}",
+            'Lamp info': f"LED {power:.0f}W {cct}K",
+            'power': power,
+            'flux': round(power * efficacy),
+            # Jaka część strumienia trafia na jezdnię - zależy od optyki
+            'utilisation': rng.uniform(0.35, 0.6),
+        })
+    return catalog
+
+
+def _class_labels(df):
+    """Najwyższa klasa M spełniona przez wiersz (jak kolumna 'class' w eksporcie), inaczej '-'"""
+    labels = np.full(len(df), '-', dtype=object)
+    # Od najsłabszej do najmocniejszej, żeby mocniejsza nadpisała słabszą
+    for name in reversed(list(NORMS)):
+        req = NORMS[name]
+        ok = ((df['Lav [cd/m2]'] >= req['Lav']) & (df['Uo (L)'] >= req['Uo']) & (df['Ul'] >= req['Ul'])
+              & (df['TI [%]'] <= req['TI']) & (df['Rei'] >= req['Rei']))
+        labels[ok.to_numpy()] = name
+    return labels
+
+
+def generate_block(start, n_rows, street, catalog, rng, n_extra=0):
+    """Generuje wiersze start..start+n_rows pliku jako DataFrame.
+
+    Kombinacje (oprawa x siatka geometrii) są brane po kolei przez stałą
+    permutację, więc już mały plik pokrywa całą siatkę równomiernie, a duży
+    powtarza ją z nowym szumem. Wyniki fotometryczne wynikają z prostego
+    modelu (natężenie ~ strumień / powierzchnia, równomierności maleją
+    z Delta/Lph, olśnienie rośnie z mocą i nachyleniem) z szumem, więc
+    rozkłady klas i wskaźników są podobne do prawdziwych eksportów.
+    """
+    grid = list(itertools.product(range(len(catalog)), *GRID.values()))
+    order = np.random.default_rng(0).permutation(len(grid))
+    combos = np.array(grid, dtype=np.float64)[order[np.arange(start, start + n_rows) % len(grid)]]
+
+    lum_idx = combos[:, 0].astype(np.int64)
+    road_w, pos_y, lph, delta, tilt = (combos[:, i] for i in range(1, 6))
+    power = np.array([c['power'] for c in catalog])[lum_idx]
+    flux = np.array([c['flux'] for c in catalog], dtype=np.float64)[lum_idx]
+    utilisation = np.array([c['utilisation'] for c in catalog])[lum_idx]
+    per_span = next((n for code, n in LUMINAIRES_PER_SPAN.items() if code in street), 1)
+
+    noise = lambda scale: rng.normal(0.0, scale, n_rows)
+    ratio = delta / lph
+    tilt_gain = 1.0 + tilt / 100.0
+
+    em = flux * utilisation * per_span / (delta * road_w) * np.exp(noise(0.1)) * tilt_gain
+    uo_e = np.clip(0.75 - 0.07 * ratio + noise(0.05), 0.05, 0.95)
+    lav = em / rng.uniform(13.0, 18.0, n_rows)
+    uo_l = np.clip(0.8 - 0.08 * ratio + noise(0.06), 0.05, 0.95)
+    ul = np.clip(0.95 - 0.1 * ratio + 0.02 * per_span + noise(0.06), 0.05, 0.98)
+    ti = np.clip(0.1 * flux / lph ** 2 / np.maximum(lav, 0.05) ** 0.8 * tilt_gain ** 2 * np.exp(noise(0.15)),
+                 1.0, 45.0)
+    rei = np.clip(0.45 + 0.05 * pos_y + tilt / 60.0 + noise(0.06), 0.1, 1.0)
+
+    df = pd.DataFrame({
+        'Ldc name': [catalog[i]['Ldc name'] for i in lum_idx],
+        'Ldc type': 'EULUMDAT',
+        'Lamp info': [catalog[i]['Lamp info'] for i in lum_idx],
+        'Total flux [lm]': flux,
+        'Total power [W]': power,
+        'Street': street,
+        'Power/km  [W/km]': np.round(1000.0 / delta * power * per_span, 1),
+        'Road W[m]': road_w,
+        'Lum pos y [m]': pos_y,
+        'Lph [m]': lph,
+        'Delta [m]': delta,
+        'Tilt [°]': tilt,
+        'Lav [cd/m2]': np.round(lav, 3),
+        'Lmin [cd/m2]': np.round(lav * uo_l, 3),
+        'Lmax [cd/m2]': np.round(lav * (1.4 + 0.1 * ratio), 3),
+        'Uo (L)': np.round(uo_l, 2),
+        'Uow (L)': np.round(np.clip(uo_l * rng.uniform(0.8, 1.0, n_rows), 0.0, 1.0), 2),
+        'Ul': np.round(ul, 2),
+        'TI [%]': np.round(ti, 1),
+        'Rei': np.round(rei, 2),
+        'Em [lx]': np.round(em, 2),
+        'Eav [lx]': np.round(em * rng.uniform(0.97, 1.03, n_rows), 2),
+        'Emin [lx]': np.round(em * uo_e, 2),
+        'Emax [lx]': np.round(em * (1.5 + 0.1 * ratio), 2),
+        'Uo (E)': np.round(uo_e, 2),
+    })
+    df['class'] = _class_labels(df)
+    df['valid'] = 'yes'
+    for k in range(n_extra):
+        df[f'Dodatkowy wynik {k + 1}'] = np.round(rng.uniform(0.0, 100.0, n_rows), 2)
+    return df[RELUX_COLUMNS + [f'Dodatkowy wynik {k + 1}' for k in range(n_extra)]]
+
+
+def _block_to_csv_bytes(block, encoding):
+    """Blok jako bajty CSV bez nagłówka - przez Arrow (kilka razy szybciej), a bez pyarrow przez pandas"""
+    if pa_csv is not None:
+        out = pa.BufferOutputStream()
+        pa_csv.write_csv(pa.Table.from_pandas(block, preserve_index=False), out,
+                         pa_csv.WriteOptions(include_header=False, delimiter=';', quoting_style='none'))
+        # Arrow pisze UTF-8 i same LF
+        return out.getvalue().to_pybytes().decode('utf-8').encode(encoding).replace(b'\n', b'\r\n')
+    return block.to_csv(sep=';', index=False, header=False, lineterminator='\r\n').encode(encoding)
+
+
+def generate_relux_csv(path, n_rows, street, catalog=None, encoding='cp1252', n_extra=0, seed=42,
+                       block_rows=500000):
+    """Zapisuje syntetyczny eksport batch: ';' jako separator, kropka dziesiętna, końce linii CRLF.
+
+    Plik jest pisany blokami, więc liczba wierszy nie jest ograniczona pamięcią.
+    """
+    catalog = catalog or build_luminaire_catalog()
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as fh:
+        for start in range(0, n_rows, block_rows):
+            block = generate_block(start, min(block_rows, n_rows - start), street, catalog, rng, n_extra)
+            if start == 0:
+                fh.write((';'.join(block.columns) + '\r\n').encode(encoding))
+            fh.write(_block_to_csv_bytes(block, encoding))
+    return path
+
+
+def generate_dataset(folder, n_rows, streets, encoding='cp1252', n_extra=0, prefix='Synthetic'):
+    """Generuje po jednym pliku na ulicę; zwraca listę ścieżek"""
+    catalog = build_luminaire_catalog()
+    paths = []
+    for i, street in enumerate(streets):
+        path = os.path.join(folder, f"{prefix}.{street}.street.batch.csv")
+        t_start = time.time()
+        generate_relux_csv(path, n_rows, street, catalog, encoding, n_extra, seed=42 + i)
+        print(f"   {os.path.basename(path)}: {n_rows} wierszy, "
+              f"{os.path.getsize(path) / (1024 * 1024):.1f} MB w {time.time() - t_start:.1f}s")
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    print(f"Generowanie syntetycznych eksportów Reluxa do: {output_dir}")
+    generate_dataset(output_dir, rows_per_file, streets, encoding, extra_columns)
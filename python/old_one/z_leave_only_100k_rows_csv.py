@@ -1,41 +1,183 @@
-import pandas as pd
+import math
 import os
+import random
+import time
+from itertools import islice
+
+import numpy as np
 
 # --- KONFIGURACJA ŚCIEŻEK ---
 base_path = os.path.dirname(__file__)
 input_file = os.path.join(base_path, '..', 'relux', 'relux_results', 'MastersCalc.2lanes_OPP.street.batch.csv')
 output_file = os.path.join(base_path, 'wycinek_100k_rows_MastersCalc.csv')
 
+# Warstwowanie próbki: None (zwykłe losowanie) albo nazwa kolumny, np. 'Street', 'Ldc name', 'Road W[m]'
+stratify_by = None
+
+
+def _reservoir_sample(lines, n_samples, rng):
+    """Algorytm L (Li, 1994): jednoprzebiegowy reservoir sampling w stałej pamięci.
+
+    Zamiast losować dla każdej linii, losujemy długość przeskoku i pomijamy
+    linie przez islice (w C), więc koszt to praktycznie samo czytanie pliku.
+    Zwraca listę (numer linii, linia).
+    """
+    reservoir = list(enumerate(islice(lines, n_samples)))
+    if len(reservoir) < n_samples:
+        return reservoir
+
+    w = math.exp(math.log(rng.random()) / n_samples)
+    idx = n_samples - 1
+    while True:
+        skip = int(math.log(rng.random()) / math.log(1 - w))
+        line = next(islice(lines, skip, skip + 1), None)
+        if line is None:
+            return reservoir
+        idx += skip + 1
+        reservoir[rng.randrange(n_samples)] = (idx, line)
+        w *= math.exp(math.log(rng.random()) / n_samples)
+
+
+def _smallest_per_group(u, groups, k):
+    """Maska k najmniejszych u w każdej grupie; k może być tablicą limitów dla numerów grup"""
+    order = np.lexsort((u, groups))
+    sorted_groups = groups[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_groups, sorted_groups)
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order] = rank < (k[sorted_groups] if isinstance(k, np.ndarray) else k)
+    return mask
+
+
+def _stratified_sample(fh, n_samples, column_idx, rng, oversample=2.0, min_keep=64, batch_bytes=64 * 1024 * 1024):
+    """Jednoprzebiegowe losowanie warstwowe z przydziałem proporcjonalnym.
+
+    Każda linia dostaje losowy klucz u (rng to numpy Generator). Próbka
+    warstwy to jej linie o najmniejszych kluczach - to równoważne losowaniu
+    bez zwracania. Żeby nie trzymać wszystkiego, zachowujemy tylko linie
+    z u < tau, gdzie tau = oversample * n / liczba_linii maleje w trakcie
+    przebiegu, plus min_keep najlepszych linii każdej warstwy (dla małych
+    warstw). Linie są czytane partiami (readlines), klucz warstwy to surowe
+    bajty pola (bez dekodowania), a losowanie, liczności i wybór kandydatów
+    są liczone wektorowo dla całej partii. Pamięć to ok. oversample * n linii
+    niezależnie od wielkości pliku.
+    Zwraca (listę (numer linii, linia), liczności warstw).
+    """
+    stratum_ids = {}  # warstwa -> numer
+    raw_ids = {}      # surowe pole (ze spacjami) -> numer warstwy
+    counts = np.zeros(0, dtype=np.int64)
+    pool_u = np.zeros(0)
+    pool_idx = np.zeros(0, dtype=np.int64)
+    pool_stratum = np.zeros(0, dtype=np.int64)
+    pool_lines = []
+    # Próg kandydata w każdej warstwie: u min_keep-tej najlepszej linii (1.0, gdy jest ich mniej)
+    thresholds = np.zeros(0)
+    seen = 0
 
-def extract_random_sample(path_in, path_out, n_samples=100000):
+    while True:
+        batch = fh.readlines(batch_bytes)
+        if not batch:
+            break
+        keys = [line.split(b';', column_idx + 1)[column_idx] for line in batch]
+        for key in set(keys).difference(raw_ids):
+            raw_ids[key] = stratum_ids.setdefault(key.strip(), len(stratum_ids))
+        stratum = np.fromiter(map(raw_ids.__getitem__, keys), dtype=np.int64, count=len(keys))
+        counts = np.append(counts, np.zeros(len(stratum_ids) - len(counts), dtype=np.int64))
+        counts += np.bincount(stratum, minlength=len(stratum_ids))
+        thresholds = np.append(thresholds, np.ones(len(stratum_ids) - len(thresholds)))
+        idx = seen + np.arange(len(batch))
+        seen += len(batch)
+        u = rng.random(len(batch))
+
+        tau = min(1.0, oversample * n_samples / max(seen, 1))
+        candidates = np.flatnonzero(u < np.maximum(thresholds, tau)[stratum])
+        pool_u = np.concatenate([pool_u, u[candidates]])
+        pool_idx = np.concatenate([pool_idx, idx[candidates]])
+        pool_stratum = np.concatenate([pool_stratum, stratum[candidates]])
+        pool_lines.extend(batch[i] for i in candidates.tolist())
+
+        # Okresowo wyrzucamy linie, które już nie mają szans, i zaostrzamy progi warstw
+        if len(pool_u) > 2 * oversample * n_samples + len(stratum_ids) * min_keep:
+            best = _smallest_per_group(pool_u, pool_stratum, min_keep)
+            keep = np.flatnonzero((pool_u < tau) | best)
+            full = np.bincount(pool_stratum[best], minlength=len(stratum_ids)) >= min_keep
+            thresholds = np.ones(len(stratum_ids))
+            thresholds[full] = 0.0
+            np.maximum.at(thresholds, pool_stratum[best], np.where(full[pool_stratum[best]], pool_u[best], 0.0))
+            pool_u, pool_idx, pool_stratum = pool_u[keep], pool_idx[keep], pool_stratum[keep]
+            pool_lines = [pool_lines[i] for i in keep.tolist()]
+
+    counts = {key: int(counts[i]) for key, i in stratum_ids.items()}
+    total = sum(counts.values())
+    if total <= n_samples:
+        quotas = dict(counts)
+    else:
+        # Przydział proporcjonalny metodą największych reszt
+        raw = {k: n_samples * c / total for k, c in counts.items()}
+        quotas = {k: int(v) for k, v in raw.items()}
+        rest = n_samples - sum(quotas.values())
+        for k in sorted(raw, key=lambda k: raw[k] - quotas[k], reverse=True)[:rest]:
+            quotas[k] += 1
+
+    limits = np.zeros(len(stratum_ids), dtype=np.int64)
+    for key, quota in quotas.items():
+        limits[stratum_ids[key]] = quota
+    available = np.bincount(pool_stratum, minlength=len(stratum_ids))
+    for key, i in stratum_ids.items():
+        if available[i] < limits[i]:
+            print(f"   Uwaga: warstwa {key.decode('cp1250', 'replace')} ma tylko {available[i]}/{limits[i]} linii")
+
+    chosen = np.flatnonzero(_smallest_per_group(pool_u, pool_stratum, limits))
+    sample = [(int(pool_idx[i]), pool_lines[i]) for i in chosen.tolist()]
+    return sample, counts
+
+
+def extract_random_sample(path_in, path_out, n_samples=100000, stratify_by=None, seed=42):
+    """Losuje n_samples wierszy z ogromnego CSV w jednym przebiegu i stałej pamięci.
+
+    Linie są kopiowane bajt w bajt (bez parsowania przez pandas), więc
+    kodowanie, separator i format liczb pozostają identyczne jak w źródle.
+    Wiersze w pliku wynikowym zachowują kolejność z pliku źródłowego.
+    """
+    rng = random.Random(seed)
+    start = time.time()
     try:
-        print(f"1. Wczytywanie pliku (17 mln wierszy)... Proszę czekać.")
-        # Wczytujemy bez konwersji typów, żeby było jak najszybciej
-        df = pd.read_csv(
-            path_in,
-            sep=';',
-            encoding='cp1250',
-            decimal=',',
-            low_memory=False
-        )
-
-        print(f"2. Losowanie {n_samples} wierszy...")
-        # Losowanie wierszy
-        df_sample = df.sample(n=n_samples, random_state=42)
-
-        print(f"3. Zapisywanie do nowego pliku: {path_out}")
-        # Zapis do nowego pliku CSV (zachowujemy separator i kodowanie)
-        df_sample.to_csv(
-            path_out,
-            sep=';',
-            encoding='cp1250',
-            decimal=',',
-            index=False
-        )
+        with open(path_in, 'rb') as fh:
+            header = fh.readline()
+
+            if stratify_by:
+                columns = [c.strip().strip('"') for c in header.decode('cp1250').rstrip('\r\n').split(';')]
+                if stratify_by not in columns:
+                    print(f"Błąd: Brak kolumny '{stratify_by}' w pliku wejściowym.")
+                    return
+                print(f"1. Losowanie warstwowe po '{stratify_by}' ({n_samples} wierszy)...")
+                sample, counts = _stratified_sample(fh, n_samples, columns.index(stratify_by),
+                                                    np.random.default_rng(seed))
+                total = sum(counts.values())
+            else:
+                print(f"1. Losowanie {n_samples} wierszy (reservoir sampling)...")
+                sample = _reservoir_sample(fh, n_samples, rng)
+                counts = None
+                total = None
+
+        print(f"2. Zapisywanie do nowego pliku: {path_out}")
+        sample.sort()
+        with open(path_out, 'wb') as out:
+            out.write(header)
+            for _, line in sample:
+                out.write(line if line.endswith(b'\n') else line + b'\r\n')
 
         print("\nSukces!")
         print(f"Plik wynikowy znajduje się w: {path_out}")
-        print(f"Rozmiar próbki: {len(df_sample)} wierszy.")
+        print(f"Rozmiar próbki: {len(sample)} wierszy.")
+        if counts:
+            print(f"Warstwy ({len(counts)}) - udział w pliku / liczba w próbce:")
+            sample_counts = {}
+            for _, line in sample:
+                key = line.split(b';', columns.index(stratify_by) + 1)[columns.index(stratify_by)].strip()
+                sample_counts[key] = sample_counts.get(key, 0) + 1
+            for key, count in sorted(counts.items(), key=lambda kv: -kv[1]):
+                print(f"   {key.decode('cp1250', 'replace')}: {count / total * 100:.2f}% / {sample_counts.get(key, 0)}")
+        print(f"Czas: {time.time() - start:.1f}s")
 
     except FileNotFoundError:
         print(f"Błąd: Nie znaleziono pliku wejściowego pod ścieżką: {path_in}")
@@ -44,4 +186,4 @@ def extract_random_sample(path_in, path_out, n_samples=100000):
 
 
 if __name__ == "__main__":
-    extract_random_sample(input_file, output_file)
\ No newline at end of file
+    extract_random_sample(input_file, output_file, stratify_by=stratify_by)